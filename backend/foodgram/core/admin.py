@@ -0,0 +1,95 @@
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from django.contrib import admin
+from django.utils.html import format_html
+
+from core.models import RequestProfile
+from core.profiling import load_profile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status',
+                    'duration_ms', 'db_queries', 'db_duration_ms', 'user')
+    list_filter = ('view_name', 'status', 'method')
+    list_select_related = ('user',)
+    search_fields = ('path',)
+    fields = ('created_at', 'method', 'path', 'view_name', 'status',
+              'duration_ms', 'db_queries', 'db_duration_ms', 'user',
+              'file_name', 'hot_frames', 'allocations', 'queries', 'stacks')
+
+    def has_module_permission(self, request):
+        # Profiles show SQL, stacks and paths of any user's requests.
+        return request.user.is_active and request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
+    def has_delete_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Горячие функции (собственные / общие '
+                               'сэмплы)')
+    def hot_frames(self, obj):
+        data = self.get_data(obj)
+        if data is None:
+            return '-'
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for line in data['stacks']:
+            stack, count = line.rsplit(' ', 1)
+            frames = stack.split(';')
+            own[frames[-1]] += int(count)
+            for frame in set(frames):
+                total[frame] += int(count)
+        lines = [f'{data["samples"]} samples every '
+                 f'{data["sample_interval"] * 1000:g} ms']
+        lines += [f'{count:>6} {total[frame]:>6}  {frame}'
+                  for frame, count in own.most_common(30)]
+        return self.format_pre('\n'.join(lines))
+
+    @admin.display(description='Выделения памяти')
+    def allocations(self, obj):
+        data = self.get_data(obj)
+        if data is None:
+            return '-'
+        lines = [f'peak {data["peak_kib"]:.1f} KiB']
+        lines += [f'{item["size_kib"]:>10.1f} KiB {item["count"]:>7}  '
+                  f'{item["location"]}' for item in data['allocations']]
+        return self.format_pre('\n'.join(lines))
+
+    @admin.display(description='SQL-запросы')
+    def queries(self, obj):
+        data = self.get_data(obj)
+        if data is None:
+            return '-'
+        return self.format_pre('\n\n'.join(
+            f'{query["duration_ms"]:.2f} ms [{query["alias"]}] '
+            f'{query["sql"]}'
+            for query in data['queries']
+        ))
+
+    @admin.display(description='Стеки (формат flame graph)')
+    def stacks(self, obj):
+        data = self.get_data(obj)
+        if data is None:
+            return '-'
+        return self.format_pre('\n'.join(data['stacks']))
+
+    @staticmethod
+    def get_data(obj: RequestProfile) -> Optional[Dict[str, Any]]:
+        if not hasattr(obj, '_profile_data'):
+            obj._profile_data = load_profile(obj)
+        return obj._profile_data
+
+    @staticmethod
+    def format_pre(text: str) -> str:
+        return format_html('<pre style="white-space: pre-wrap">{}</pre>',
+                           text)
@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS,
+    )
+
+
+class BulkCreateDelete:
+    """
+    Base class of bulk endpoints that link the user to many objects,
+    e.g. recipes in favorites, given as `{"ids": [...]}`.
+
+    Subclasses check all objects with one query in `get_links`,
+    which returns {id: is_linked} of existing objects, and write
+    with one statement in `perform_create` and `perform_delete`,
+    which return ids of rows actually written. Links may change between
+    the check and the write, so the results and everything derived from
+    the write follow the returned ids. The response has a result per id
+    with the status and errors the single object endpoint would return.
+    """
+    ERRORS_KEY: str = 'errors'
+    NOT_FOUND_ERROR_MESSAGE: str = 'Объект не найден!'
+
+    def __init__(self, request: Request, already_exists_error_message: str,
+                 not_exists_error_message: str) -> None:
+        self.request: Request = request
+        self.user = request.user
+        self.already_exists_error_message: str = already_exists_error_message
+        self.not_exists_error_message: str = not_exists_error_message
+
+    def create(self) -> Response:
+        ids = self._get_ids()
+        links = self.get_links(ids)
+        errors = {}
+        for pk in ids:
+            if pk not in links:
+                errors[pk] = (status.HTTP_404_NOT_FOUND,
+                              self.NOT_FOUND_ERROR_MESSAGE)
+                continue
+            error_message = (self.already_exists_error_message
+                             if links[pk] else self.validate_create(pk))
+            if error_message is not None:
+                errors[pk] = (status.HTTP_400_BAD_REQUEST, error_message)
+        created = [pk for pk in ids if pk not in errors]
+        if created:
+            with transaction.atomic():
+                written = set(self.perform_create(created))
+            for pk in created:
+                if pk not in written:
+                    # Linked concurrently after the check.
+                    errors[pk] = (status.HTTP_400_BAD_REQUEST,
+                                  self.already_exists_error_message)
+        return self._get_response(ids, errors, status.HTTP_201_CREATED)
+
+    def delete(self) -> Response:
+        ids = self._get_ids()
+        links = self.get_links(ids)
+        errors = {}
+        for pk in ids:
+            if pk not in links:
+                errors[pk] = (status.HTTP_404_NOT_FOUND,
+                              self.NOT_FOUND_ERROR_MESSAGE)
+            elif not links[pk]:
+                errors[pk] = (status.HTTP_400_BAD_REQUEST,
+                              self.not_exists_error_message)
+        deleted = [pk for pk in ids if pk not in errors]
+        if deleted:
+            with transaction.atomic():
+                written = set(self.perform_delete(deleted))
+            for pk in deleted:
+                if pk not in written:
+                    # Unlinked concurrently after the check.
+                    errors[pk] = (status.HTTP_400_BAD_REQUEST,
+                                  self.not_exists_error_message)
+        return self._get_response(ids, errors, status.HTTP_204_NO_CONTENT)
+
+    def get_links(self, ids: List[int]) -> Dict[int, bool]:
+        raise NotImplementedError
+
+    def validate_create(self, pk: int) -> Optional[str]:
+        """Returns an error message if the link to `pk` is not allowed."""
+        return None
+
+    def perform_create(self, ids: List[int]) -> List[int]:
+        """Links `ids` and returns ids of created links."""
+        raise NotImplementedError
+
+    def perform_delete(self, ids: List[int]) -> List[int]:
+        """Unlinks `ids` and returns ids of deleted links."""
+        raise NotImplementedError
+
+    def _get_ids(self) -> List[int]:
+        serializer = BulkIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def _get_response(self, ids: List[int], errors: Dict[int, tuple],
+                      success_status: int) -> Response:
+        results = []
+        for pk in ids:
+            if pk in errors:
+                error_status, message = errors[pk]
+                results.append({'id': pk, 'status': error_status,
+                                self.ERRORS_KEY: message})
+            else:
+                results.append({'id': pk, 'status': success_status})
+        return Response(results, status.HTTP_200_OK)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = 'version'
+RESPONSE_KEY_PREFIX = 'response'
+SINGLE_FLIGHT_LOCKS = tuple(threading.Lock() for _ in range(64))
+
+
+def get_response_cache() -> BaseCache:
+    return caches[settings.RESPONSE_CACHE]
+
+
+def make_version_token() -> str:
+    return f'{time.time():.6f}-{uuid4().hex}'
+
+
+def get_version_time(token: str) -> float:
+    """Returns the time of the bump of `token` or 0 if it is unknown."""
+    try:
+        return float(token.split('-', 1)[0])
+    except ValueError:
+        return 0.0
+
+
+def get_versions(names: Sequence[str]) -> List[str]:
+    """
+    Returns current tokens of version counters `names`.
+
+    Tokens are random rather than incremented, so a counter evicted from
+    the cache starts over with a new token and can only cause misses.
+    They start with the time of the bump, see `get_version_time`.
+    """
+    cache = get_response_cache()
+    keys = [f'{VERSION_KEY_PREFIX}:{name}' for name in names]
+    tokens: Dict[str, str] = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            cache.add(key, make_version_token(), None)
+            tokens[key] = cache.get(key)
+    return [tokens[key] for key in keys]
+
+
+def replace_version(name: str) -> Tuple[str, str]:
+    """
+    Bumps the counter `name` immediately, not on commit, and returns
+    its previous and new tokens. Concurrent bumps must be serialized by
+    the caller.
+    """
+    previous = get_versions([name])[0]
+    token = make_version_token()
+    get_response_cache().set(f'{VERSION_KEY_PREFIX}:{name}', token, None)
+    return previous, token
+
+
+def bump_versions(*names: str) -> None:
+    """Bumps version counters `names` when the transaction commits."""
+    def bump() -> None:
+        get_response_cache().set_many({
+            f'{VERSION_KEY_PREFIX}:{name}': make_version_token()
+            for name in names
+        }, None)
+
+    transaction.on_commit(bump)
+
+
+def get_sorted_query_params(request: Request) -> List[Tuple[str, List[str]]]:
+    return sorted(
+        (name, sorted(request.query_params.getlist(name)))
+        for name in request.query_params
+    )
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Caches `list` and `retrieve` data for anonymous users.
+
+    Keys consist of the absolute URI with sorted query params and tokens
+    of version counters returned by `get_response_cache_versions`, so
+    cached data is invalidated by bumping a counter instead of a TTL.
+    On a miss only one thread of the worker builds the response,
+    the others wait for it and read it from the cache.
+
+    Values that change too often to be covered by the counters can be
+    left out of the cached data by the view and added to it per request
+    in `render_cached_data`.
+    """
+
+    def get_response_cache_versions(self) -> Sequence[str]:
+        raise NotImplementedError(
+            'Override `get_response_cache_versions` to use the cache.'
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request,
+                                        *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request,
+                                        *args, **kwargs)
+
+    def get_cached_response(self, view_method: Callable[..., Response],
+                            request: Request, *args, **kwargs) -> Response:
+        if not request.user.is_anonymous:
+            return view_method(request, *args, **kwargs)
+        cache = get_response_cache()
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(self.render_cached_data(data))
+        lock = SINGLE_FLIGHT_LOCKS[hash(key) % len(SINGLE_FLIGHT_LOCKS)]
+        with lock:
+            data = cache.get(key)
+            if data is not None:
+                return Response(self.render_cached_data(data))
+            response = view_method(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data)
+                response.data = self.render_cached_data(response.data)
+        return response
+
+    def render_cached_data(self, data: Any) -> Any:
+        """Returns the response data for `data` of the cache."""
+        return data
+
+    def get_response_cache_key(self, request: Request) -> str:
+        digest = hashlib.md5(json.dumps([
+            request.build_absolute_uri(request.path),
+            get_sorted_query_params(request),
+            get_versions(self.get_response_cache_versions()),
+        ]).encode()).hexdigest()
+        return f'{RESPONSE_KEY_PREFIX}:{self.basename}:{digest}'
+
+
+class ConditionalGetMixin:
+    """
+    Sends `ETag` and `Last-Modified` of `list` and `retrieve` responses
+    made of tokens of version counters returned by
+    `get_conditional_versions`, so `If-None-Match` and
+    `If-Modified-Since` of unchanged data are answered with 304 before
+    the queryset is read and the serializers run.
+
+    Counters of data of the user, if any, must be among the versions,
+    which also makes tags of users different.
+    """
+
+    def get_conditional_versions(self) -> Sequence[str]:
+        raise NotImplementedError(
+            'Override `get_conditional_versions` to use conditional GET.'
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().list, request,
+                                             *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().retrieve, request,
+                                             *args, **kwargs)
+
+    def get_conditional_response(self, view_method: Callable[..., Response],
+                                 request: Request, *args,
+                                 **kwargs) -> Response:
+        names = self.get_conditional_versions()
+        tokens = get_versions(names)
+        digest = hashlib.md5(json.dumps([
+            request.build_absolute_uri(request.path),
+            get_sorted_query_params(request),
+            request.accepted_renderer.format,
+            names,
+            tokens,
+        ]).encode()).hexdigest()
+        # Pagination counts may be estimates, so bodies can differ.
+        etag = f'W/{quote_etag(digest)}'
+        last_modified = int(max(map(get_version_time, tokens), default=0))
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified or None,
+        )
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        if request.user.is_authenticated:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
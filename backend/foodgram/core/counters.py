@@ -0,0 +1,61 @@
+from typing import Any, Tuple
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.expressions import Expression
+from django.db.models.functions import Coalesce
+from django.db.models.query import QuerySet
+
+
+class CounterFieldsMixin:
+    """
+    Model mixin that never writes `COUNTER_FIELDS` of existing rows in
+    `save()`, so an instance loaded before a counter changed does not
+    write its stale value back, e.g. in the admin or a serializer
+    `update()`. Counters are changed by the functions below only.
+    """
+    COUNTER_FIELDS: Tuple[str, ...] = ()
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.attname for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [
+                name for name in update_fields
+                if name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+def increment_counter(queryset: QuerySet, field: str) -> int:
+    return queryset.update(**{field: F(field) + 1})
+
+
+def decrement_counter(queryset: QuerySet, field: str) -> int:
+    """Never drops below zero, so drift cannot break the update."""
+    return queryset.filter(**{f'{field}__gt': 0}).update(
+        **{field: F(field) - 1}
+    )
+
+
+def count_subquery(queryset: QuerySet, field: str) -> Expression:
+    """Counts rows of `queryset` whose `field` points to the outer row."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def reconcile_counter(queryset: QuerySet, field: str,
+                      related_queryset: QuerySet, related_field: str) -> int:
+    """
+    Resets `field` of the rows of `queryset` whose value differs from the
+    number of related rows. Returns the number of fixed rows.
+    """
+    actual = count_subquery(related_queryset, related_field)
+    return queryset.exclude(**{field: actual}).update(**{field: actual})
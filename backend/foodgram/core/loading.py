@@ -0,0 +1,65 @@
+import csv
+import io
+from typing import Any, List, Type
+
+from django.db import connections, router, transaction
+from django.db.models import Field, Model
+
+
+def insert_ignore_conflicts(model: Type[Model],
+                            instances: List[Model]) -> None:
+    """
+    Inserts `instances` skipping rows that violate unique constraints.
+    Uses COPY on PostgreSQL and `bulk_create` elsewhere. Primary keys
+    are not set on the instances and signals are not sent.
+    """
+    if not instances:
+        return
+    using = router.db_for_write(model)
+    if connections[using].vendor == 'postgresql':
+        _copy_ignore_conflicts(model, instances, using)
+    else:
+        model.objects.using(using).bulk_create(instances,
+                                               ignore_conflicts=True)
+
+
+def _copy_ignore_conflicts(model: Type[Model], instances: List[Model],
+                           using: str) -> None:
+    """
+    COPY into a temporary table and INSERT ... ON CONFLICT DO NOTHING
+    from there, as COPY itself cannot skip existing rows.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    table = quote_name(model._meta.db_table)
+    temp_table = quote_name(f'copy_{model._meta.db_table}')
+    columns = ', '.join(quote_name(field.column) for field in fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for instance in instances:
+        writer.writerow([
+            _get_copy_value(field, instance, connection) for field in fields
+        ])
+    buffer.seek(0)
+    with transaction.atomic(using), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {temp_table} '
+            f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+        )
+        cursor.execute(f'TRUNCATE {temp_table}')
+        cursor.cursor.copy_expert(
+            f'COPY {temp_table} ({columns}) FROM STDIN '
+            f"WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT {columns} FROM {temp_table} ON CONFLICT DO NOTHING'
+        )
+
+
+def _get_copy_value(field: Field, instance: Model, connection) -> Any:
+    value = field.get_db_prep_save(field.pre_save(instance, True), connection)
+    return '\\N' if value is None else value
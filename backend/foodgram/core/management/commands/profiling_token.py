@@ -0,0 +1,17 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_profiling_token
+
+
+class Command(BaseCommand):
+    help = '''
+    Prints a header that makes the server profile a request. The token
+    expires in PROFILING_TOKEN_MAX_AGE seconds. Profiles are listed in
+    the admin.
+    '''
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        return f'{settings.PROFILING_HEADER}: {make_profiling_token()}'
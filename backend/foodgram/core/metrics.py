@@ -0,0 +1,296 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Dict[str, Any]
+
+DURATION_METRIC = 'foodgram_http_request_duration_seconds'
+DB_DURATION_METRIC = 'foodgram_http_request_db_duration_seconds_total'
+DB_QUERIES_METRIC = 'foodgram_http_request_db_queries_total'
+RESPONSES_METRIC = 'foodgram_http_responses_total'
+# Sum of snapshots of workers that stopped, kept so totals never drop.
+STOPPED_WORKERS_FILE_NAME = 'stopped-workers.json'
+LOCK_FILE_NAME = '.metrics.lock'
+
+
+class RequestMetrics:
+    """
+    Per-endpoint latency histograms and SQL totals of the worker.
+
+    With `METRICS_DIR` every worker writes its snapshot to its own file
+    in that directory at most once per `METRICS_FLUSH_INTERVAL` seconds,
+    and `collect` sums the files of all workers, so every worker serves
+    the metrics of the whole gunicorn. Files of workers that are no
+    longer running, or whose pid was reused, are added to
+    `STOPPED_WORKERS_FILE_NAME` under a file lock, as the multiprocess
+    mode of prometheus_client does, so counters never decrease. Pids are
+    checked, so the directory must not be shared by processes of other
+    hosts or containers. Without it only the metrics of the current
+    process are reported.
+    """
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.endpoints: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.responses: Dict[Tuple[str, str, str], int] = {}
+        self.flushed_at: float = 0.0
+        # Pid that wrote the file of the worker, changes after a fork.
+        self.flushed_pid: Optional[int] = None
+
+    @property
+    def buckets(self) -> Tuple[float, ...]:
+        return tuple(settings.METRICS_LATENCY_BUCKETS)
+
+    def observe(self, view: str, method: str, status: int, duration: float,
+                db_duration: float, db_queries: int) -> None:
+        buckets = self.buckets
+        with self.lock:
+            endpoint = self.endpoints.get((view, method))
+            if endpoint is None:
+                endpoint = self.endpoints[(view, method)] = {
+                    'buckets': [0] * (len(buckets) + 1),
+                    'count': 0,
+                    'sum': 0.0,
+                    'db_sum': 0.0,
+                    'db_queries': 0,
+                }
+            index = next((i for i, bound in enumerate(buckets)
+                          if duration <= bound), len(buckets))
+            endpoint['buckets'][index] += 1
+            endpoint['count'] += 1
+            endpoint['sum'] += duration
+            endpoint['db_sum'] += db_duration
+            endpoint['db_queries'] += db_queries
+            key = (view, method, str(status))
+            self.responses[key] = self.responses.get(key, 0) + 1
+        if time.monotonic() - self.flushed_at >= (
+            settings.METRICS_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def snapshot(self) -> Snapshot:
+        with self.lock:
+            return {
+                'buckets': list(self.buckets),
+                'endpoints': [
+                    [view, method, dict(data, buckets=list(data['buckets']))]
+                    for (view, method), data in self.endpoints.items()
+                ],
+                'responses': [
+                    [*key, count] for key, count in self.responses.items()
+                ],
+            }
+
+    def flush(self) -> None:
+        """Writes the snapshot of the worker to `METRICS_DIR`."""
+        self.flushed_at = time.monotonic()
+        directory = self.get_directory()
+        if directory is None:
+            return
+        pid = os.getpid()
+        path = directory / f'metrics-{pid}.json'
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            if self.flushed_pid != pid:
+                # The file is left by a stopped worker with the same pid.
+                with self.lock_directory(directory):
+                    if path.exists():
+                        self.add_to_stopped_workers(directory, path)
+                self.flushed_pid = pid
+            self.write_snapshot(path, self.snapshot())
+        except OSError as error:
+            logger.warning(f'Metrics are not flushed to {directory}: '
+                           f'{error!r}')
+
+    def collect(self) -> Snapshot:
+        """Returns the metrics of all workers."""
+        directory = self.get_directory()
+        if directory is None:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        try:
+            with self.lock_directory(directory):
+                for path in directory.glob('metrics-*.json'):
+                    if not self.is_worker_running(path):
+                        self.add_to_stopped_workers(directory, path)
+                        continue
+                    snapshots.append(self.read_snapshot(path))
+                snapshots.append(self.read_snapshot(
+                    directory / STOPPED_WORKERS_FILE_NAME
+                ))
+        except OSError as error:
+            logger.warning(f'Metrics are not collected from {directory}: '
+                           f'{error!r}')
+            return self.snapshot()
+        return self.merge([snapshot for snapshot in snapshots
+                           if snapshot is not None])
+
+    def add_to_stopped_workers(self, directory: Path, path: Path) -> None:
+        """Moves the snapshot in `path` to the sum of stopped workers."""
+        snapshot = self.read_snapshot(path)
+        if snapshot is not None:
+            stopped_path = directory / STOPPED_WORKERS_FILE_NAME
+            stopped = self.read_snapshot(stopped_path)
+            self.write_snapshot(stopped_path, self.merge(
+                [stopped, snapshot] if stopped is not None else [snapshot]
+            ))
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    @contextmanager
+    def lock_directory(directory: Path) -> Iterator[None]:
+        """Serializes changes of files of other workers between processes."""
+        with open(directory / LOCK_FILE_NAME, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def read_snapshot(path: Path) -> Optional[Snapshot]:
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def write_snapshot(path: Path, snapshot: Snapshot) -> None:
+        tmp_path = path.with_name(
+            f'.{path.stem}-{os.getpid()}-{threading.get_ident()}.tmp'
+        )
+        tmp_path.write_text(json.dumps(snapshot))
+        # Readers never see a half written file.
+        os.replace(tmp_path, path)
+
+    def merge(self, snapshots: List[Snapshot]) -> Snapshot:
+        buckets = list(self.buckets)
+        endpoints: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        responses: Dict[Tuple[str, str, str], int] = {}
+        for snapshot in snapshots:
+            # Files written before the buckets were changed.
+            if snapshot['buckets'] != buckets:
+                continue
+            for view, method, data in snapshot['endpoints']:
+                endpoint = endpoints.get((view, method))
+                if endpoint is None:
+                    endpoints[(view, method)] = data
+                    continue
+                endpoint['buckets'] = [
+                    a + b for a, b in zip(endpoint['buckets'], data['buckets'])
+                ]
+                for name in ('count', 'sum', 'db_sum', 'db_queries'):
+                    endpoint[name] += data[name]
+            for view, method, status, count in snapshot['responses']:
+                key = (view, method, status)
+                responses[key] = responses.get(key, 0) + count
+        return {
+            'buckets': buckets,
+            'endpoints': [[view, method, data]
+                          for (view, method), data in endpoints.items()],
+            'responses': [[*key, count] for key, count in responses.items()],
+        }
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text format."""
+        snapshot = self.collect()
+        endpoints = sorted(snapshot['endpoints'], key=lambda item: item[:2])
+        lines = [
+            f'# HELP {DURATION_METRIC} Wall time of requests by view.',
+            f'# TYPE {DURATION_METRIC} histogram',
+        ]
+        for view, method, data in endpoints:
+            labels = self.format_labels(view=view, method=method)
+            cumulative = 0
+            bounds = [*map(repr, map(float, snapshot['buckets'])), '+Inf']
+            for bound, count in zip(bounds, data['buckets']):
+                cumulative += count
+                bucket_labels = self.format_labels(view=view, method=method,
+                                                   le=bound)
+                lines.append(f'{DURATION_METRIC}_bucket{bucket_labels} '
+                             f'{cumulative}')
+            lines.append(f'{DURATION_METRIC}_sum{labels} {data["sum"]!r}')
+            lines.append(f'{DURATION_METRIC}_count{labels} {data["count"]}')
+        lines += [
+            f'# HELP {DB_DURATION_METRIC} Time of SQL queries by view.',
+            f'# TYPE {DB_DURATION_METRIC} counter',
+        ]
+        lines += [
+            f'{DB_DURATION_METRIC}'
+            f'{self.format_labels(view=view, method=method)} '
+            f'{data["db_sum"]!r}'
+            for view, method, data in endpoints
+        ]
+        lines += [
+            f'# HELP {DB_QUERIES_METRIC} Number of SQL queries by view.',
+            f'# TYPE {DB_QUERIES_METRIC} counter',
+        ]
+        lines += [
+            f'{DB_QUERIES_METRIC}'
+            f'{self.format_labels(view=view, method=method)} '
+            f'{data["db_queries"]}'
+            for view, method, data in endpoints
+        ]
+        lines += [
+            f'# HELP {RESPONSES_METRIC} Number of responses by view '
+            f'and status.',
+            f'# TYPE {RESPONSES_METRIC} counter',
+        ]
+        lines += [
+            f'{RESPONSES_METRIC}'
+            f'{self.format_labels(view=view, method=method, status=status)} '
+            f'{count}'
+            for view, method, status, count in sorted(snapshot['responses'])
+        ]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def format_labels(**labels: str) -> str:
+        values = ','.join(
+            '{}="{}"'.format(name, value.replace('\\', r'\\').replace(
+                '"', r'\"'
+            ).replace('\n', r'\n'))
+            for name, value in labels.items()
+        )
+        return f'{{{values}}}'
+
+    @staticmethod
+    def is_worker_running(path: Path) -> bool:
+        """Checks the pid in the name of the file of a worker."""
+        try:
+            pid = int(path.stem.split('-', 1)[1])
+        except (IndexError, ValueError):
+            return False
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Running under another user.
+            pass
+        return True
+
+    @staticmethod
+    def get_directory() -> Optional[Path]:
+        if not settings.METRICS_DIR:
+            return None
+        return Path(settings.METRICS_DIR)
+
+
+request_metrics = RequestMetrics()
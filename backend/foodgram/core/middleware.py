@@ -0,0 +1,75 @@
+import time
+from contextlib import ExitStack
+from typing import Any, Callable
+
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from core.metrics import request_metrics
+from core.profiling import is_profiling_requested, profile_request
+
+
+class QueryTimer:
+    """Execute wrapper that counts queries and sums their time."""
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.duration: float = 0.0
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool,
+                 context: dict) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, SQL time and the number of queries of requests
+    by view name in `core.metrics.request_metrics` and returns them in
+    the `Server-Timing` header.
+
+    Requests that are not resolved to a view are recorded as
+    `<unresolved>`, so unknown paths cannot blow up the labels.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        request_metrics.observe(
+            match.view_name if match else '<unresolved>', request.method,
+            response.status_code, duration, timer.duration, timer.count,
+        )
+        response['Server-Timing'] = (
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} '
+            f'queries", total;dur={duration * 1000:.1f}'
+        )
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles requests for which `is_profiling_requested` is true and
+    saves the profiles, which are listed in the admin. Other requests
+    only pay for the check of the header and the query param.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not is_profiling_requested(request):
+            return self.get_response(request)
+        return profile_request(request, self.get_response)
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.18 on 2026-10-18 06:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата профилирования')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2048, verbose_name='Путь')),
+                ('view_name', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Статус ответа')),
+                ('duration_ms', models.FloatField(verbose_name='Время ответа, мс')),
+                ('db_queries', models.PositiveIntegerField(verbose_name='Число SQL-запросов')),
+                ('db_duration_ms', models.FloatField(verbose_name='Время SQL-запросов, мс')),
+                ('file_name', models.CharField(max_length=100, verbose_name='Файл профиля')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'request profile',
+                'verbose_name_plural': 'request profiles',
+                'ordering': ('-id',),
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """
+    A profiled request. Samples, allocations and SQL are stored in
+    `file_name` in `PROFILING_DIR`.
+    """
+    created_at = models.DateTimeField(
+        'Дата профилирования',
+        auto_now_add=True,
+    )
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Путь', max_length=2048)
+    view_name = models.CharField('Представление', max_length=200,
+                                 blank=True)
+    status = models.PositiveSmallIntegerField('Статус ответа')
+    duration_ms = models.FloatField('Время ответа, мс')
+    db_queries = models.PositiveIntegerField('Число SQL-запросов')
+    db_duration_ms = models.FloatField('Время SQL-запросов, мс')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    file_name = models.CharField('Файл профиля', max_length=100)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'request profile'
+        verbose_name_plural = 'request profiles'
+
+    def __str__(self) -> str:
+        return f'{self.method} {self.path} {self.created_at}'
@@ -1,8 +1,252 @@
+import binascii
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Type
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Model, Q
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_estimated_count(model: Type[Model], using: str) -> Optional[int]:
+    """
+    Returns the PostgreSQL planner estimate of rows in the model table
+    or None on other backends and for never analyzed tables.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            (model._meta.db_table,),
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedPage(Page):
+    """Page that knows whether it has a next page regardless of count."""
+
+    def __init__(self, object_list, number: int, paginator: Paginator,
+                 has_next: bool) -> None:
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+
+class CountCachingPaginator(Paginator):
+    """
+    Paginator that avoids exact `COUNT(*)` on every request.
+
+    Querysets without a WHERE clause are counted by the planner estimate
+    once the table has `PAGINATION_COUNT_ESTIMATE_THRESHOLD` rows.
+    Other counts are cached under `cache_key` for
+    `PAGINATION_COUNT_CACHE_TIMEOUT` seconds. `count_is_exact` is false
+    for estimates, whose pages are validated against actual rows.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 cache_key: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key: Optional[str] = cache_key
+        self.count_is_exact: bool = True
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = get_estimated_count(queryset.model, queryset.db)
+            if (estimate is not None and estimate
+                    >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD):
+                self.count_is_exact = False
+                return estimate
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count,
+                      settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def validate_number(self, number: Any) -> int:
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # An estimate may be lower than the actual number of rows.
+            if self.count_is_exact or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number: Any) -> Page:
+        number = self.validate_number(number)
+        if self.count_is_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1]
+        )
+        return EstimatedPage(object_list[:self.per_page], number, self,
+                             has_next=len(object_list) > self.per_page)
 
 
 class LimitPagionation(PageNumberPagination):
+    """
+    Page number pagination with an opt-in cursor mode.
+
+    Cursor mode is enabled by the `cursor` query param (empty for
+    the first page) on views that define `cursor_ordering`, a sequence
+    of unique together fields such as `('-created_at', '-id')`.
+    Pages are fetched with a keyset condition on these fields instead of
+    `OFFSET`, so they are stable under concurrent inserts and no count
+    query is made. The response contains only `next` and `results`.
+    Querysets ordered otherwise, e.g. by search rank, cannot be
+    paginated by these fields and reject the cursor.
+
+    In page number mode counts come from `CountCachingPaginator`, cached
+    per path, user and filter params, and `count_is_exact` is added
+    to the response.
+    """
     max_page_size = settings.MAX_PAGE_SIZE_PAGINATION
     page_size_query_param = 'limit'
     page_size = settings.DEFAULT_PAGE_SIZE_PAGINATION
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    cursor_ordering_message = 'Курсор нельзя использовать с этой сортировкой.'
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request,
+                          view=None) -> Optional[List[Any]]:
+        self.cursor_ordering = getattr(view, 'cursor_ordering', None)
+        self.request = request
+        if (not self.cursor_ordering
+                or self.cursor_query_param not in request.query_params):
+            self.cursor_ordering = None
+            return super().paginate_queryset(queryset, request, view)
+
+        ordering = tuple(queryset.query.order_by)
+        if ordering != tuple(self.cursor_ordering[:len(ordering)]):
+            raise ParseError(self.cursor_ordering_message)
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        queryset = queryset.order_by(*self.cursor_ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_condition(position)
+                )
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[:page_size + 1])
+        self.page = results[:page_size]
+        self.next_position = None
+        if len(results) > page_size:
+            last = self.page[-1]
+            # Rows of `values()` querysets are dicts.
+            self.next_position = [
+                last[field.lstrip('-')] if isinstance(last, dict)
+                else getattr(last, field.lstrip('-'))
+                for field in self.cursor_ordering
+            ]
+        return self.page
+
+    def django_paginator_class(self, queryset: QuerySet,
+                               page_size: int) -> CountCachingPaginator:
+        return CountCachingPaginator(
+            queryset, page_size,
+            cache_key=self.get_count_cache_key(self.request),
+        )
+
+    def get_count_cache_key(self, request: Request) -> str:
+        """
+        Returns cache key of the count of `request` results.
+        Params that do not change the count are skipped, the rest are
+        sorted, so that the same filters share a single key.
+        """
+        ignored = (self.page_query_param, self.page_size_query_param,
+                   self.cursor_query_param)
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name)))
+            for name in request.query_params
+            if name not in ignored
+        )
+        digest = hashlib.md5(
+            json.dumps([request.path, request.user.pk, params]).encode()
+        ).hexdigest()
+        return f'pagination-count:{digest}'
+
+    def get_paginated_response(self, data: List[Any]) -> Response:
+        if self.cursor_ordering is None:
+            return Response(OrderedDict([
+                ('count', self.page.paginator.count),
+                ('count_is_exact', self.page.paginator.count_is_exact),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data),
+            ]))
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_keyset_condition(self, position: Sequence[Any]) -> Q:
+        """
+        Returns rows that follow `position` in `cursor_ordering`:
+        (a < x) OR (a = x AND b < y) OR ... for descending fields.
+        """
+        condition = Q()
+        for i, field in enumerate(self.cursor_ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(
+                **{
+                    previous.lstrip('-'): value
+                    for previous, value in zip(self.cursor_ordering[:i],
+                                               position)
+                },
+                **{f'{name}__{lookup}': position[i]},
+            )
+        return condition
+
+    def get_next_cursor_link(self) -> Optional[str]:
+        if self.next_position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position: Sequence[Any]) -> str:
+        # `str` keeps microseconds of datetimes, unlike `DjangoJSONEncoder`.
+        data = json.dumps(position, default=str)
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> Optional[List[Any]]:
+        if not cursor:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.cursor_ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.db import connections
+from django.db.models import F, ForeignKey, Model, Window
+from django.db.models.functions import RowNumber
+from django.db.models.query import QuerySet
+
+ROW_NUMBER_ALIAS = 'limited_prefetch_row_number'
+
+
+def prefetch_limited(instances: Sequence[Model], related_name: str,
+                     limit: int, queryset: Optional[QuerySet] = None,
+                     to_attr: Optional[str] = None) -> None:
+    """
+    Prefetches at most `limit` objects of the reverse foreign key
+    `related_name` for every instance with a single window query:
+
+        SELECT * FROM (
+            SELECT ..., ROW_NUMBER() OVER (
+                PARTITION BY <fk> ORDER BY <ordering>
+            ) FROM ... WHERE <fk> IN (<instances>)
+        ) WHERE row_number <= limit
+
+    Objects are stored as a list in `to_attr` (`<related_name>_limited`
+    by default) in the ordering of `queryset` or of the related model.
+    `queryset` must not use `select_related` or defer the foreign key.
+    """
+    to_attr = to_attr or f'{related_name}_limited'
+    if not instances:
+        return
+    relation = type(instances[0])._meta.get_field(related_name)
+    foreign_key = relation.field
+    related_model = relation.related_model
+    if queryset is None:
+        queryset = related_model._default_manager.all()
+    sql, params = get_limited_sql(
+        queryset, foreign_key, [instance.pk for instance in instances], limit,
+    )
+    related_objects = related_model._default_manager.raw(sql, params)
+    groups = defaultdict(list)
+    for obj in related_objects:
+        groups[getattr(obj, foreign_key.attname)].append(obj)
+    for instance in instances:
+        related = groups.get(instance.pk, [])
+        for obj in related:
+            foreign_key.set_cached_value(obj, instance)
+        setattr(instance, to_attr, related)
+
+
+def get_limited_values(queryset: QuerySet, foreign_key: str,
+                       ids: Sequence[int], limit: int,
+                       fields: Sequence[str]) -> Dict[int, List[dict]]:
+    """
+    Returns `fields` of at most `limit` rows of `queryset` per value of
+    `foreign_key` in `ids`, the same rows as `prefetch_limited`.
+    Values come from the cursor without converters of fields, so
+    `fields` must be of types the database driver returns as is.
+    """
+    groups = defaultdict(list)
+    if not ids:
+        return groups
+    model_foreign_key = queryset.model._meta.get_field(foreign_key)
+    sql, params = get_limited_sql(
+        queryset.values(*fields, model_foreign_key.attname),
+        model_foreign_key, ids, limit,
+    )
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        for row in cursor.fetchall():
+            values = dict(zip(columns, row))
+            groups[values[model_foreign_key.attname]].append(
+                {field: values[field] for field in fields}
+            )
+    return groups
+
+
+def get_limited_sql(queryset: QuerySet, foreign_key: ForeignKey,
+                    ids: Sequence[Any], limit: int) -> Tuple[str, tuple]:
+    """
+    Returns the window query of at most `limit` rows of `queryset` per
+    value of `foreign_key` in `ids`, ordered by the row number.
+    """
+    ordering = (queryset.query.order_by
+                or queryset.model._meta.ordering
+                or ('pk',))
+    order_by = [
+        F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+        for field in ordering
+    ]
+    queryset = queryset.filter(**{
+        f'{foreign_key.name}__in': ids
+    }).annotate(**{
+        ROW_NUMBER_ALIAS: Window(
+            RowNumber(),
+            partition_by=F(foreign_key.attname),
+            order_by=order_by,
+        ),
+    }).order_by()
+    sql, params = queryset.query.sql_with_params()
+    return (
+        f'SELECT * FROM ({sql}) limited_prefetch '
+        f'WHERE {ROW_NUMBER_ALIAS} <= %s ORDER BY {ROW_NUMBER_ALIAS}',
+        (*params, limit),
+    )
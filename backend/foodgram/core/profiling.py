@@ -0,0 +1,210 @@
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.models import RequestProfile
+
+SIGNING_SALT = 'core.profiling'
+
+
+def make_profiling_token() -> str:
+    """Returns a value of `PROFILING_HEADER` that enables profiling."""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(uuid4().hex)
+
+
+def is_profiling_requested(request: HttpRequest) -> bool:
+    """
+    Profiling is requested by `PROFILING_HEADER` with a token of
+    `make_profiling_token` or by `PROFILING_QUERY_PARAM` of staff users.
+    """
+    token = request.headers.get(settings.PROFILING_HEADER)
+    if token is not None:
+        try:
+            signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+                token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+            )
+        except signing.BadSignature:
+            return False
+        return True
+    if settings.PROFILING_QUERY_PARAM not in request.GET:
+        return False
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        # The API authenticates with tokens, not with sessions.
+        try:
+            user_auth = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        user = user_auth[0] if user_auth else None
+    return user is not None and user.is_staff
+
+
+class StackSampler:
+    """
+    Counts stacks of the current thread from a background thread every
+    `interval` seconds, in the collapsed format of flame graph tools.
+    The sampler gets the GIL at least every `sys.getswitchinterval()`,
+    so smaller intervals do not add samples.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval: float = interval
+        self.stacks: Counter = Counter()
+        self.thread_id: int = threading.get_ident()
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=self.sample,
+                                                         daemon=True)
+
+    def __enter__(self) -> 'StackSampler':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+class QueryRecorder:
+    """
+    Execute wrapper that keeps SQL and time of queries. Parameters are
+    not kept, they hold tokens, password hashes and personal data.
+    """
+
+    def __init__(self) -> None:
+        self.queries: List[Dict[str, Any]] = []
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool,
+                 context: dict) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'many': many,
+                'duration_ms': (time.perf_counter() - started) * 1000,
+            })
+
+
+def profile_request(request: HttpRequest,
+                    get_response: Callable[[HttpRequest], HttpResponse]
+                    ) -> HttpResponse:
+    """Returns the response of `request` and saves its profile."""
+    recorder = QueryRecorder()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+    except AttributeError:
+        # Python < 3.9, the peak is counted from the start of tracing.
+        pass
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            sampler = stack.enter_context(
+                StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+            )
+            response = get_response(request)
+        duration = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    allocations = [
+        {
+            'location': str(statistic.traceback),
+            'size_kib': statistic.size / 1024,
+            'count': statistic.count,
+        }
+        for statistic in snapshot.statistics('lineno')[
+            :settings.PROFILING_TOP_ALLOCATIONS
+        ]
+    ]
+    save_profile(request, response, duration, {
+        'sample_interval': settings.PROFILING_SAMPLE_INTERVAL,
+        'samples': sum(sampler.stacks.values()),
+        'stacks': [f'{stack} {count}'
+                   for stack, count in sampler.stacks.most_common()],
+        'peak_kib': peak / 1024,
+        'allocations': allocations,
+        'queries': recorder.queries,
+    })
+    return response
+
+
+def get_profiles_dir() -> Path:
+    return Path(settings.PROFILING_DIR)
+
+
+def save_profile(request: HttpRequest, response: HttpResponse,
+                 duration: float, data: Dict[str, Any]) -> RequestProfile:
+    """
+    Writes `data` to `PROFILING_DIR` and removes the oldest profiles
+    over `PROFILING_MAX_PROFILES`.
+    """
+    directory = get_profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid4().hex[:8]}.json'
+    (directory / file_name).write_text(json.dumps(data))
+    match = request.resolver_match
+    user = getattr(request, 'user', None)
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:2048],
+        view_name=match.view_name if match else '',
+        status=response.status_code,
+        duration_ms=duration * 1000,
+        db_queries=len(data['queries']),
+        db_duration_ms=sum(query['duration_ms']
+                           for query in data['queries']),
+        user=user if user is not None and user.is_authenticated else None,
+        file_name=file_name,
+    )
+    stale = RequestProfile.objects.order_by('-id')[
+        settings.PROFILING_MAX_PROFILES:
+    ]
+    # Files are removed by the post_delete signal.
+    for old_profile in stale:
+        old_profile.delete()
+    return profile
+
+
+def load_profile(profile: RequestProfile) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((get_profiles_dir() / profile.file_name).read_text())
+    except (OSError, ValueError):
+        return None
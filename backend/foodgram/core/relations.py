@@ -0,0 +1,74 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import Model
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that validates a list of keys with one query.
+
+    With `many=True`, or in a child serializer of `BulkListSerializer`,
+    all keys of the list are fetched by `prefetch` before the items are
+    validated. Missing keys fail as in `PrimaryKeyRelatedField`.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.prefetched: Optional[Dict[int, Model]] = None
+
+    @classmethod
+    def many_init(cls, *args: Any, **kwargs: Any) -> 'BulkManyRelatedField':
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def prefetch(self, data: Iterable[Any]) -> None:
+        pks = []
+        for value in data:
+            pk = self._to_pk(value)
+            if pk is not None:
+                pks.append(pk)
+        self.prefetched = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data: Any) -> Model:
+        pk = self._to_pk(data)
+        if self.prefetched is None or pk is None:
+            return super().to_internal_value(data)
+        if pk not in self.prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return self.prefetched[pk]
+
+    def _to_pk(self, value: Any) -> Optional[int]:
+        if self.pk_field is not None or isinstance(value, bool):
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data: Any) -> List[Model]:
+        if isinstance(data, list):
+            self.child_relation.prefetch(data)
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Prefetches objects of `BulkPrimaryKeyRelatedField` fields of the child
+    for all items of the list.
+    """
+
+    def to_internal_value(self, data: Any) -> List[Dict[str, Any]]:
+        if isinstance(data, list):
+            for name, field in self.child.fields.items():
+                if isinstance(field, BulkPrimaryKeyRelatedField):
+                    field.prefetch(item.get(name) for item in data
+                                   if isinstance(item, dict))
+        return super().to_internal_value(data)
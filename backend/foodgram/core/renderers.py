@@ -0,0 +1,48 @@
+from typing import Any, List, Optional
+from uuid import uuid4
+
+from rest_framework.renderers import JSONRenderer
+
+
+class RawJSON(str):
+    """JSON text that `RawJSONRenderer` outputs as is."""
+
+
+class RawJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` that inserts `RawJSON` values of the data without
+    encoding them, so pre-rendered documents are concatenated instead of
+    being serialized again.
+    """
+
+    def render(self, data: Any, accepted_media_type: Optional[str] = None,
+               renderer_context: Optional[dict] = None) -> bytes:
+        fragments: List[str] = []
+        placeholder = uuid4().hex
+        data = self.replace_fragments(data, placeholder, fragments)
+        rendered = super().render(data, accepted_media_type,
+                                  renderer_context)
+        if not fragments:
+            return rendered
+        # Containers are encoded in order, so placeholders are too.
+        parts = rendered.split(f'"{placeholder}"'.encode())
+        result = [parts[0]]
+        for fragment, part in zip(fragments, parts[1:]):
+            result += (fragment.encode(), part)
+        return b''.join(result)
+
+    @classmethod
+    def replace_fragments(cls, data: Any, placeholder: str,
+                          fragments: List[str]) -> Any:
+        if isinstance(data, RawJSON):
+            fragments.append(data)
+            return placeholder
+        if isinstance(data, dict):
+            return {
+                key: cls.replace_fragments(value, placeholder, fragments)
+                for key, value in data.items()
+            }
+        if isinstance(data, (list, tuple)):
+            return [cls.replace_fragments(item, placeholder, fragments)
+                    for item in data]
+        return data
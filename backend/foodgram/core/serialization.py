@@ -0,0 +1,63 @@
+import json
+from functools import lru_cache
+from typing import Any, Iterable, Mapping, Optional, Sequence, Tuple
+
+from django.core.files.storage import Storage
+
+from core.renderers import RawJSON
+
+# Options of `JSONRenderer`, whose output fragments must match.
+_encode = json.JSONEncoder(
+    ensure_ascii=False, allow_nan=False, separators=(',', ':'),
+).encode
+
+
+def encode_json(value: Any) -> str:
+    """
+    Returns JSON of a value of JSON type as `JSONRenderer` renders it.
+    The C encoder is used, types of the DRF encoder are not supported.
+    """
+    return _encode(value).replace('\u2028', '\\u2028').replace(
+        '\u2029', '\\u2029'
+    )
+
+
+class FieldPlan:
+    """
+    Keys of a JSON object in the order of `fields`, encoded once, so
+    objects are rendered by joining them with encoded values instead of
+    building an `OrderedDict` per object.
+    """
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.prefixes: Tuple[str, ...] = tuple(
+            f'{"," if i else "{"}{encode_json(field)}:'
+            for i, field in enumerate(self.fields)
+        )
+
+    def render(self, values: Mapping[str, Any]) -> RawJSON:
+        """Values that are `RawJSON` are inserted as is."""
+        if not self.fields:
+            return RawJSON('{}')
+        parts = []
+        for prefix, field in zip(self.prefixes, self.fields):
+            value = values[field]
+            parts += (prefix, value if isinstance(value, RawJSON)
+                      else encode_json(value))
+        parts.append('}')
+        return RawJSON(''.join(parts))
+
+
+def render_json_list(items: Iterable[str]) -> RawJSON:
+    return RawJSON(f'[{",".join(items)}]')
+
+
+@lru_cache(maxsize=None)
+def get_field_plan(fields: Tuple[str, ...]) -> FieldPlan:
+    return FieldPlan(fields)
+
+
+def get_file_url(storage: Storage, name: str) -> Optional[str]:
+    """URL of a file field value as `FileField` renders it without request."""
+    return storage.url(name) if name else None
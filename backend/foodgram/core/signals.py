@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.models import RequestProfile
+from core.profiling import get_profiles_dir
+
+
+@receiver(post_delete, sender=RequestProfile)
+def remove_profile_file(sender, instance, **kwargs):
+    path = get_profiles_dir() / instance.file_name
+
+    def remove() -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    transaction.on_commit(remove)
@@ -0,0 +1,164 @@
+from typing import Any, List, Optional, Sequence, Type
+
+from django.db import connections, router
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save
+
+
+def insert_ignore_returning(model: Type[Model],
+                            **values: Any) -> Optional[Model]:
+    """
+    Creates a `model` row from `values` (attnames such as `owner_id`)
+    with a single `INSERT ... ON CONFLICT DO NOTHING RETURNING` statement.
+
+    Returns the instance built from the returned columns or None if the
+    row violates a unique constraint, so concurrent inserts cannot raise
+    `IntegrityError`. `post_save` is sent as if the instance was saved.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in values]
+    columns = ', '.join(quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    returning = ', '.join(
+        quote_name(field.column) for field in [model._meta.pk, *fields]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(model._meta.db_table)} ({columns}) '
+            f'VALUES ({placeholders}) ON CONFLICT DO NOTHING '
+            f'RETURNING {returning}',
+            [
+                field.get_db_prep_save(value, connection)
+                for field, value in zip(fields, values.values())
+            ],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    instance = model(pk=row[0], **dict(zip(values, row[1:])))
+    instance._state.adding = False
+    instance._state.db = using
+    post_save.send(sender=model, instance=instance, created=True,
+                   update_fields=None, raw=False, using=using)
+    return instance
+
+
+def delete_returning(model: Type[Model], **filters: Any) -> Optional[Model]:
+    """
+    Deletes the `model` row matching `filters` (attnames compared for
+    equality) with a single `DELETE ... RETURNING` statement.
+
+    Returns the instance built from the returned columns or None if there
+    was no such row. `post_delete` is sent as if the instance was deleted.
+    Must not be used for models that other rows depend on, as cascades
+    are not collected.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in filters]
+    conditions = ' AND '.join(
+        f'{quote_name(field.column)} = %s' for field in fields
+    )
+    returning = ', '.join(
+        quote_name(field.column) for field in [model._meta.pk, *fields]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(model._meta.db_table)} '
+            f'WHERE {conditions} '
+            f'RETURNING {returning}',
+            [
+                field.get_db_prep_value(value, connection)
+                for field, value in zip(fields, filters.values())
+            ],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    instance = model(pk=row[0], **dict(zip(filters, row[1:])))
+    instance._state.adding = False
+    instance._state.db = using
+    post_delete.send(sender=model, instance=instance, using=using)
+    return instance
+
+
+def bulk_insert_ignore_returning(model: Type[Model], field: str,
+                                 values: Sequence[Any],
+                                 **common: Any) -> List[Any]:
+    """
+    Creates a `model` row for every value of `field` in `values` with
+    `common` values (attnames such as `owner_id`) with a single
+    `INSERT ... ON CONFLICT DO NOTHING RETURNING` statement.
+
+    Returns values of `field` of the inserted rows, rows that violate
+    a unique constraint are skipped. Signals are not sent, callers do
+    what the receivers do for the returned values.
+    """
+    if not values:
+        return []
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in common]
+    returned_field = model._meta.get_field(field)
+    columns = ', '.join(
+        quote_name(field.column) for field in [*fields, returned_field]
+    )
+    row_placeholders = f'({", ".join(["%s"] * (len(fields) + 1))})'
+    common_params = [
+        field.get_db_prep_save(value, connection)
+        for field, value in zip(fields, common.values())
+    ]
+    params = []
+    for value in values:
+        params += (*common_params,
+                   returned_field.get_db_prep_save(value, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(model._meta.db_table)} ({columns}) '
+            f'VALUES {", ".join([row_placeholders] * len(values))} '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {quote_name(returned_field.column)}',
+            params,
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def bulk_delete_returning(model: Type[Model], field: str,
+                          values: Sequence[Any], **filters: Any) -> List[Any]:
+    """
+    Deletes `model` rows whose `field` is in `values` and that match
+    `filters` (attnames compared for equality) with a single
+    `DELETE ... RETURNING` statement.
+
+    Returns values of `field` of the deleted rows. Signals are not sent
+    and cascades are not collected, as in `delete_returning`.
+    """
+    if not values:
+        return []
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in filters]
+    returned_field = model._meta.get_field(field)
+    conditions = ' AND '.join([
+        *(f'{quote_name(field.column)} = %s' for field in fields),
+        f'{quote_name(returned_field.column)} IN '
+        f'({", ".join(["%s"] * len(values))})',
+    ])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(model._meta.db_table)} '
+            f'WHERE {conditions} '
+            f'RETURNING {quote_name(returned_field.column)}',
+            [
+                *(field.get_db_prep_value(value, connection)
+                  for field, value in zip(fields, filters.values())),
+                *(returned_field.get_db_prep_value(value, connection)
+                  for value in values),
+            ],
+        )
+        return [row[0] for row in cursor.fetchall()]
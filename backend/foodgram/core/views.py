@@ -0,0 +1,17 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from core.metrics import request_metrics
+
+
+class MetricsView(APIView):
+    """Request metrics of all workers in the Prometheus text format."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request: Request) -> HttpResponse:
+        return HttpResponse(
+            request_metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -16,6 +16,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
@@ -28,11 +29,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,6 +71,31 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shopping_cart_pdf': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SHOPPING_CART_PDF_CACHE_DIR',
+                              default=BASE_DIR / 'cache' / 'shopping_cart'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # Holds version counters of cached responses, so it has to be shared
+    # by all workers, e.g. memcached, when gunicorn runs several of them.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -121,6 +149,15 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'fontTools': {
+            'level': 'WARNING',
+        },
+        'fpdf': {
+            'level': 'WARNING',
+        },
+        'PIL': {
+            'level': 'WARNING',
+        },
     },
 }
 
@@ -132,11 +169,64 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.RawJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 MAX_PAGE_SIZE_PAGINATION = 100
 DEFAULT_PAGE_SIZE_PAGINATION = 25
+BULK_MAX_IDS = 100
 RECIPES_MAX_LIMIT_IN_SUBSCRIPTIONS = 25
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 10_000
+RESPONSE_CACHE = 'responses'
+# Memberships are checked against version counters of `RESPONSE_CACHE`,
+# so this cache has to be shared by all workers too, e.g. memcached,
+# when gunicorn runs several of them.
+USER_MEMBERSHIPS_CACHE = 'default'
+USER_MEMBERSHIPS_CACHE_TIMEOUT = 60 * 5
+
+INGREDIENT_SEARCH_INDEX_ENABLED = True
+INGREDIENT_SEARCH_INDEX_MAX_AGE = 300
+SHOPPING_CART_PDF_CACHE = 'shopping_cart_pdf'
+SHOPPING_CART_PDF_RENDERER = os.getenv(
+    'SHOPPING_CART_PDF_RENDERER',
+    default='recipes.services.FpdfShoppingCartRenderer',
+)
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+SHOPPING_CART_PDF_BOLD_FONT = os.getenv(
+    'SHOPPING_CART_PDF_BOLD_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+)
+
+# Directory shared by gunicorn workers to sum their request metrics,
+# without it /api/metrics/ shows the metrics of one worker.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+# A request is profiled if it has the header with a token printed by
+# the profiling_token command or the query param of a staff user.
+PROFILING_HEADER = 'X-Profile-Token'
+PROFILING_QUERY_PARAM = 'profile'
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+PROFILING_DIR = os.getenv('PROFILING_DIR',
+                          default=BASE_DIR / 'profiles')
+PROFILING_MAX_PROFILES = 100
+PROFILING_SAMPLE_INTERVAL = 0.001
+PROFILING_TOP_ALLOCATIONS = 30
+
+# Snapshots of tags and ingredients are immutable, new content gets
+# a new URL from /api/catalog/version/.
+CATALOG_SNAPSHOT_MAX_AGE = 60 * 60 * 24 * 365
+CATALOG_SNAPSHOTS_KEPT = 5
 
 
 CORS_ORIGIN_ALLOW_ALL = True
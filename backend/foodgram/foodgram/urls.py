@@ -3,9 +3,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import MetricsView
+
 api_urls = [
     path('', include('users.urls')),
     path('', include('recipes.urls')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
 urlpatterns = [
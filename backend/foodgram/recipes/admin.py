@@ -2,12 +2,12 @@ from django.contrib import admin
 from django.utils.safestring import mark_safe
 
 from .models import (CartItem, Favorite, Ingredient, Recipe, RecipeIngredient,
-                     Tag)
+                     ShoppingCartTotal, Tag)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'total_number_of_favorites')
     list_filter = ('author', 'name', 'tags')
     fields = ('pk', 'author', 'name', 'image', 'text', 'cooking_time', 'tags',
               'total_number_of_favorites', 'created_at', 'ingredients')
@@ -24,7 +24,7 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(
         description='Общее число добавлений этого рецепта в избранное')
     def total_number_of_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @admin.display(description='Ингредиенты')
     def ingredients(self, obj):
@@ -76,9 +76,19 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
+    list_select_related = ('owner', 'recipe')
     search_fields = ('owner__username', 'recipe__name')
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
+    list_select_related = ('owner', 'recipe')
     search_fields = ('owner__username', 'recipe__name')
+
+
+@admin.register(ShoppingCartTotal)
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'ingredient', 'amount')
+    list_select_related = ('owner', 'ingredient')
+    search_fields = ('owner__username', 'ingredient__name')
+    readonly_fields = ('owner', 'ingredient', 'amount')
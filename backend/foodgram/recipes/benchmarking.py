@@ -0,0 +1,69 @@
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.catalog import load_snapshot_bodies
+from recipes.search import ingredient_search_index
+
+# 1x1 transparent PNG.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAA'
+    'C0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII='
+)
+
+Step = Tuple[str, str, Optional[dict]]
+
+
+@contextmanager
+def isolated_environment() -> Iterator[None]:
+    """
+    Swaps caches for local memory ones and MEDIA_ROOT for a temporary
+    directory and runs in a transaction that is rolled back.
+    """
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        CACHES={
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'benchmark-{alias}',
+            }
+            for alias in settings.CACHES
+        },
+        MEDIA_ROOT=media_root,
+    ), transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def clear_caches() -> None:
+    """
+    Clears Django caches and the in-memory copies workers keep of
+    ingredients and catalog snapshots. Caches of code, e.g. serializer
+    field plans and the PDF font subset, stay warm as in a running worker.
+    """
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    ingredient_search_index.clear()
+    load_snapshot_bodies.cache_clear()
+
+
+def run_steps(client: APIClient, steps: List[Step]) -> float:
+    """Returns the wall time of requests, which must succeed."""
+    elapsed = 0.0
+    for method, path, data in steps:
+        started = time.perf_counter()
+        response = getattr(client, method)(path, data, format='json')
+        elapsed += time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path} returned '
+                f'{response.status_code} {response.content[:200]}'
+            )
+    return elapsed
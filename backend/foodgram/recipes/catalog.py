@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.cache import get_response_cache, get_versions
+from recipes.models import CatalogSnapshot, Ingredient, Tag
+from recipes.serializers.common import IngredientSerializer, TagSerializer
+from recipes.services import RecipeCacheVersions
+
+try:
+    import brotli
+except ImportError:
+    # Snapshots are served with gzip only.
+    brotli = None
+
+DIGEST_KEY_PREFIX = 'catalog-snapshot'
+
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """
+    Checks whether `Accept-Encoding` allows `coding`: it is listed, or
+    `*` is, without `q=0`.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        name, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities.get(coding, qualities.get('*', 0.0)) > 0
+
+
+class CatalogSnapshots:
+    """
+    Snapshots of the responses of `/api/tags/` and `/api/ingredients/`,
+    stored under the SHA-256 of their JSON and compressed with gzip and,
+    if installed, brotli in advance, so they are served as immutable
+    files.
+
+    A snapshot is built on the first request after the version counter
+    of its list, bumped by signals on `Tag` and `Ingredient` changes,
+    see `RecipeCacheVersions`. Its digest is cached under the token of
+    the counter, so the current digest costs one cache read and a list
+    changed back keeps its digest.
+    """
+    LISTS = {
+        'tags': (Tag, TagSerializer, RecipeCacheVersions.TAGS),
+        'ingredients': (Ingredient, IngredientSerializer,
+                        RecipeCacheVersions.INGREDIENTS),
+    }
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_digests(cls) -> Dict[str, str]:
+        """Returns digests of current snapshots of the lists."""
+        cache = get_response_cache()
+        tokens = get_versions([version for _, _, version
+                               in cls.LISTS.values()])
+        keys = {
+            name: f'{DIGEST_KEY_PREFIX}:{name}:{token}'
+            for name, token in zip(cls.LISTS, tokens)
+        }
+        digests = cache.get_many(keys.values())
+        result = {}
+        for name, key in keys.items():
+            digest = digests.get(key)
+            if digest is None:
+                with cls._lock:
+                    digest = cache.get(key)
+                    if digest is None:
+                        # The list is read after the token, so it is not
+                        # older than the token.
+                        digest = cls.build(name)
+                        cache.set(key, digest, None)
+            result[name] = digest
+        return result
+
+    @classmethod
+    def build(cls, name: str) -> str:
+        """Saves the snapshot of the list `name` and returns its digest."""
+        model, serializer_class, _ = cls.LISTS[name]
+        body = JSONRenderer().render(
+            serializer_class(model.objects.order_by('pk'), many=True).data
+        )
+        digest = hashlib.sha256(body).hexdigest()
+        if CatalogSnapshot.objects.filter(name=name, digest=digest).exists():
+            return digest
+        try:
+            with transaction.atomic():
+                CatalogSnapshot.objects.create(
+                    name=name,
+                    digest=digest,
+                    body=body,
+                    gzip_body=gzip.compress(body, compresslevel=9),
+                    brotli_body=(brotli.compress(body)
+                                 if brotli is not None else None),
+                )
+        except IntegrityError:
+            # Saved by another worker.
+            return digest
+        stale = CatalogSnapshot.objects.filter(name=name).exclude(
+            digest=digest
+        ).order_by('-created_at').values_list('pk', flat=True)[
+            settings.CATALOG_SNAPSHOTS_KEPT - 1:
+        ]
+        CatalogSnapshot.objects.filter(pk__in=list(stale)).delete()
+        return digest
+
+    @classmethod
+    def get_encoded_body(cls, name: str, digest: str, accept_encoding: str
+                         ) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Returns the body of the snapshot for `accept_encoding` and its
+        `Content-Encoding` or None if the snapshot does not exist.
+        """
+        if name not in cls.LISTS:
+            return None
+        try:
+            bodies = load_snapshot_bodies(name, digest)
+        except CatalogSnapshot.DoesNotExist:
+            return None
+        if bodies['br'] is not None and accepts_encoding(accept_encoding,
+                                                         'br'):
+            return bodies['br'], 'br'
+        if accepts_encoding(accept_encoding, 'gzip'):
+            return bodies['gzip'], 'gzip'
+        return bodies['identity'], None
+
+
+@lru_cache(maxsize=8)
+def load_snapshot_bodies(name: str, digest: str) -> Dict[str, bytes]:
+    """Snapshots are immutable, so workers keep them in memory."""
+    snapshot = CatalogSnapshot.objects.get(name=name, digest=digest)
+    return {
+        'identity': bytes(snapshot.body),
+        'gzip': bytes(snapshot.gzip_body),
+        'br': (bytes(snapshot.brotli_body)
+               if snapshot.brotli_body is not None else None),
+    }
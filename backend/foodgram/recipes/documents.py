@@ -0,0 +1,208 @@
+import threading
+from contextlib import contextmanager
+from functools import reduce
+from operator import or_
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, TextField, Value, When
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from core.counters import increment_counter
+from core.renderers import RawJSON
+from recipes.memberships import UserMemberships
+from recipes.models import Recipe, RecipeDocument
+
+
+class RecipeDocuments:
+    """
+    Pre-rendered `RecipeSerializer` JSON of recipes.
+
+    Values that depend on the request or change often (`is_favorited`,
+    `is_in_shopping_cart`, `author.is_subscribed` and `favorites_count`)
+    are `null` in a document and the image URL is relative. `render`
+    replaces them, so responses are made of documents instead of
+    serialized object graphs.
+
+    Signals invalidate documents by incrementing `version` in the
+    transactions that change recipes, their tags, ingredients or authors.
+    A document is valid while `built_version` equals `version`. Missing
+    and stale documents are built on read: the row is created before
+    the recipe is read and the body is saved only if the version did
+    not change meanwhile, so a concurrent write cannot be lost.
+    """
+    # Keys are followed by quotes only outside of JSON strings.
+    NULL_VALUE_TEMPLATE: str = '"{}":null'
+    # Documents start with the id, see `RecipeSerializer.Meta.fields`.
+    ID_PREFIX: str = '{"id":'
+    IMAGE_PREFIX: str = '"image":"/'
+    SAVE_BATCH_SIZE: int = 100
+    _batch = threading.local()
+
+    @staticmethod
+    def invalidate(**filters) -> None:
+        """Invalidates documents matching `filters`."""
+        increment_counter(RecipeDocument.objects.filter(**filters), 'version')
+
+    @classmethod
+    def invalidate_recipes(cls, recipe_ids: Iterable[int]) -> None:
+        """
+        Invalidates documents of `recipe_ids`, at the end of the
+        enclosing `batch_invalidation` block if there is one.
+        """
+        recipe_ids = set(recipe_ids)
+        batch = getattr(cls._batch, 'recipe_ids', None)
+        if batch is not None:
+            batch |= recipe_ids
+        elif recipe_ids:
+            cls.invalidate(recipe_id__in=recipe_ids)
+
+    @classmethod
+    @contextmanager
+    def batch_invalidation(cls) -> Iterator[None]:
+        """
+        Collects `invalidate_recipes` calls of the block into one update,
+        since signals of ingredients and tags of a recipe arrive for every
+        row. Should be used inside the transaction of the changes.
+        """
+        if getattr(cls._batch, 'recipe_ids', None) is not None:
+            yield
+            return
+        cls._batch.recipe_ids = set()
+        try:
+            yield
+            recipe_ids = cls._batch.recipe_ids
+        finally:
+            cls._batch.recipe_ids = None
+        if recipe_ids:
+            cls.invalidate(recipe_id__in=recipe_ids)
+
+    @classmethod
+    def invalidate_all(cls) -> None:
+        cls.invalidate()
+
+    @staticmethod
+    def get_bodies(recipes: Iterable[Recipe]) -> Dict[int, str]:
+        """
+        Returns valid documents of `recipes`, which should be loaded with
+        `select_related('document')`.
+        """
+        bodies = {}
+        for recipe in recipes:
+            try:
+                document = recipe.document
+            except ObjectDoesNotExist:
+                continue
+            if document.built_version == document.version:
+                bodies[recipe.pk] = document.body
+        return bodies
+
+    @classmethod
+    def build(cls, recipe_ids: List[int],
+              render_many: Callable[[List[int]], Dict[int, str]]
+              ) -> Dict[int, str]:
+        """
+        Builds documents of `recipe_ids` with `render_many`, which returns
+        bodies of existing recipes of the ids, and returns the bodies.
+        """
+        try:
+            with transaction.atomic():
+                RecipeDocument.objects.bulk_create(
+                    (RecipeDocument(recipe_id=recipe_id)
+                     for recipe_id in recipe_ids),
+                    ignore_conflicts=True,
+                )
+        except IntegrityError:
+            # A recipe was deleted after the page was read.
+            existing_ids = Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values_list('pk', flat=True)
+            RecipeDocument.objects.bulk_create(
+                (RecipeDocument(recipe_id=recipe_id)
+                 for recipe_id in existing_ids),
+                ignore_conflicts=True,
+            )
+        versions = dict(RecipeDocument.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'version'))
+        bodies = render_many(list(versions))
+        items = list(bodies.items())
+        # SQLite limits the depth of the expression tree of conditions.
+        for start in range(0, len(items), cls.SAVE_BATCH_SIZE):
+            batch = items[start:start + cls.SAVE_BATCH_SIZE]
+            RecipeDocument.objects.filter(reduce(or_, (
+                Q(recipe_id=recipe_id, version=versions[recipe_id])
+                for recipe_id, _ in batch
+            ))).update(
+                body=Case(
+                    *(When(recipe_id=recipe_id, then=Value(body))
+                      for recipe_id, body in batch),
+                    output_field=TextField(),
+                ),
+                built_version=F('version'),
+            )
+        return bodies
+
+    @classmethod
+    def render(cls, body: str, recipe: Recipe,
+               memberships: Optional[UserMemberships],
+               request: Optional[Request],
+               favorites_count: bool = True) -> RawJSON:
+        """
+        Returns the document with values for `recipe` and the request.
+        `memberships` is None for anonymous users. Without
+        `favorites_count` the count stays `null` for
+        `render_favorites_counts`.
+        """
+        flags = {
+            'is_subscribed': (memberships is not None
+                              and memberships.is_subscribed(recipe.author_id)),
+            'is_favorited': (memberships is not None
+                             and memberships.is_favorited(recipe.pk)),
+            'is_in_shopping_cart': (
+                memberships is not None
+                and memberships.is_in_shopping_cart(recipe.pk)
+            ),
+        }
+        for name, value in flags.items():
+            body = body.replace(cls.NULL_VALUE_TEMPLATE.format(name),
+                                f'"{name}":{"true" if value else "false"}', 1)
+        if favorites_count:
+            body = cls._replace_favorites_count(body, recipe.favorites_count)
+        if request is not None:
+            body = body.replace(
+                cls.IMAGE_PREFIX,
+                f'"image":"{request.build_absolute_uri("/")}', 1,
+            )
+        if hasattr(recipe, 'search_snippet'):
+            snippet = 'null'
+            if recipe.search_snippet is not None:
+                snippet = JSONRenderer().render(recipe.search_snippet).decode()
+            body = f'{body[:-1]},"search_snippet":{snippet}}}'
+        return RawJSON(body)
+
+    @classmethod
+    def render_favorites_counts(cls, documents: List[str]) -> List[RawJSON]:
+        """
+        Fills current `favorites_count` of documents rendered without it
+        with one query.
+        """
+        ids = [
+            int(document[len(cls.ID_PREFIX):document.index(',')])
+            for document in documents
+        ]
+        counts = dict(Recipe.objects.filter(pk__in=ids).values_list(
+            'pk', 'favorites_count'
+        ))
+        return [
+            RawJSON(cls._replace_favorites_count(document,
+                                                 counts.get(recipe_id, 0)))
+            for recipe_id, document in zip(ids, documents)
+        ]
+
+    @classmethod
+    def _replace_favorites_count(cls, body: str, count: int) -> str:
+        return body.replace(cls.NULL_VALUE_TEMPLATE.format('favorites_count'),
+                            f'"favorites_count":{count}', 1)
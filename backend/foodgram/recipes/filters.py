@@ -1,9 +1,9 @@
-from django.db.models import (Case, Exists, IntegerField, OuterRef, Subquery,
-                              Value, When)
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
 from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
 
 from recipes.models import CartItem, Favorite, Ingredient, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(filters.FilterSet):
@@ -39,27 +39,33 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_in_shopping_cart',
         method='filter_is_in_shopping_cart',
     )
+    search = filters.CharFilter(method='filter_search')
+    search_highlight = filters.BooleanFilter(method='filter_search_highlight')
 
     def filter_is_favorited(self, queryset, name, value):
-        return queryset.annotate(
-            is_favorited=Exists(Subquery(
-                Favorite.objects.filter(
-                    owner=self.request.user,
-                    recipe=OuterRef('pk'),
-                )
-            )),
-        ).filter(is_favorited=value)
+        return self._filter_by_memberships(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        return queryset.annotate(
-            is_in_shopping_cart=Exists(Subquery(
-                CartItem.objects.filter(
-                    owner=self.request.user,
-                    recipe=OuterRef('pk'),
-                )
-            )),
-        ).filter(is_in_shopping_cart=value)
+        return self._filter_by_memberships(queryset, CartItem, value)
+
+    def _filter_by_memberships(self, queryset, model, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        lookup = Exists(
+            model.objects.filter(owner=user, recipe=OuterRef('pk')),
+        )
+        return queryset.filter(lookup) if value else queryset.exclude(lookup)
+
+    def filter_search(self, queryset, name, value):
+        highlight = bool(self.form.cleaned_data.get('search_highlight'))
+        return search_recipes(queryset, value, highlight)
+
+    def filter_search_highlight(self, queryset, name, value):
+        """Only changes the output of `search`."""
+        return queryset
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'search_highlight')
@@ -0,0 +1,247 @@
+import io
+import json
+import statistics
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser, OutputWrapper)
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.benchmarking import (IMAGE, Step, clear_caches,
+                                  isolated_environment, run_steps)
+from recipes.management.commands.generate_synthetic_data import \
+    SyntheticDataGenerator
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+BASELINE_PATH = settings.BASE_DIR.parent.parent / 'data' / 'api_benchmark.json'
+
+
+class BenchmarkCase(NamedTuple):
+    name: str
+    user: Optional[User]
+    steps: List[Step]
+
+
+class Command(BaseCommand):
+    help = '''
+    Measures wall time, SQL queries and peak allocated memory of the hot
+    API endpoints in-process, with the Django test client.
+    Every request runs with empty caches in a transaction that is rolled
+    back, so the uncached path is measured and the database is kept.
+    The default baseline in `data/` is measured on the csv files there
+    loaded with csv_to_db. With --save the results are stored as a JSON
+    baseline, otherwise they are compared with it and the command fails
+    if an endpoint is slower or allocates more than --threshold percent
+    over the baseline or makes more queries.
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--baseline', type=Path,
+                            default=BASELINE_PATH,
+                            help='Path of the JSON baseline')
+        parser.add_argument('--save', action='store_true',
+                            help='Store the results as the baseline')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Allowed regression in percent')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--cases', nargs='+',
+                            help='Names of cases to run, all by default')
+        parser.add_argument('--seed', type=int,
+                            help='Generate synthetic data with this seed '
+                                 'before the run and roll it back after')
+        parser.add_argument('--scale', type=float, default=1,
+                            help='Multiplier of the synthetic data sizes')
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        with isolated_environment():
+            if options['seed'] is not None:
+                self.generate_data(options['seed'], options['scale'])
+            results = self.run_cases(options['cases'], options['iterations'])
+        if options['save']:
+            options['baseline'].write_text(json.dumps(results, indent=2))
+            return f'Baseline is saved to {options["baseline"]}.'
+        if not options['baseline'].exists():
+            raise CommandError(f'Baseline {options["baseline"]} does not '
+                               f'exist, create it with --save.')
+        regressions = self.compare(
+            results, json.loads(options['baseline'].read_text()),
+            options['threshold'],
+        )
+        if regressions:
+            raise CommandError('Regressions:\n' + '\n'.join(regressions))
+        return 'No regressions.'
+
+    def generate_data(self, seed: int, scale: float) -> None:
+        sizes = {
+            name: int(size * scale)
+            for name, size in SyntheticDataGenerator.DEFAULT_SIZES.items()
+        }
+        SyntheticDataGenerator(
+            seed, 10_000, OutputWrapper(io.StringIO())
+        ).generate(**sizes)
+
+    def run_cases(self, names: Optional[List[str]],
+                  iterations: int) -> Dict[str, Dict[str, float]]:
+        cases = self.get_cases()
+        if names:
+            unknown = set(names) - {case.name for case in cases}
+            if unknown:
+                raise CommandError(f'Unknown cases: {", ".join(unknown)}')
+            cases = [case for case in cases if case.name in names]
+        self.stdout.write(f'{"case":<36} {"median ms":>10} {"p95 ms":>10} '
+                          f'{"queries":>8} {"peak KiB":>10}')
+        results = {}
+        for case in cases:
+            result = self.benchmark(case, iterations)
+            self.stdout.write(
+                f'{case.name:<36} {result["median_ms"]:>10.1f} '
+                f'{result["p95_ms"]:>10.1f} {result["queries"]:>8} '
+                f'{result["peak_kib"]:>10.0f}'
+            )
+            results[case.name] = result
+        return results
+
+    def get_cases(self) -> List[BenchmarkCase]:
+        reader = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'id').first()
+        recipe = Recipe.objects.select_related('author').order_by(
+            '-favorites_count', 'id'
+        ).first()
+        if reader is None or recipe is None:
+            raise CommandError('The database is empty, load it with '
+                               'csv_to_db or pass --seed.')
+        cart_owner = User.objects.annotate(
+            items=Count('shopping_cart')
+        ).order_by('-items', 'id').first()
+        toggled = Recipe.objects.exclude(favorites__owner=reader).exclude(
+            cartitems__owner=reader
+        ).order_by('id').first() or recipe
+        tag = Tag.objects.annotate(
+            recipes_count=Count('recipes')
+        ).order_by('-recipes_count', 'id').first()
+        ingredients = list(Ingredient.objects.annotate(
+            recipes_count=Count('recipe_ingredient')
+        ).order_by('-recipes_count', 'id')[:5])
+        recipe_data = {
+            'tags': [tag.pk] if tag else [],
+            'ingredients': [{'id': ingredient.pk, 'amount': 10}
+                            for ingredient in ingredients],
+            'name': 'Benchmark recipe',
+            'image': IMAGE,
+            'text': 'Benchmark recipe text',
+            'cooking_time': 30,
+        }
+        tag_filter = f'&tags={tag.slug}' if tag else ''
+        recipes_url = '/api/recipes/'
+        recipe_url = f'/api/recipes/{recipe.pk}/'
+        toggled_url = f'/api/recipes/{toggled.pk}/'
+        return [
+            BenchmarkCase('recipes_list_anonymous', None,
+                          [('get', f'{recipes_url}?limit=6', None)]),
+            BenchmarkCase('recipes_list_filtered_anonymous', None, [
+                ('get', f'{recipes_url}?limit=6{tag_filter}', None),
+            ]),
+            BenchmarkCase('recipes_list_authenticated', reader,
+                          [('get', f'{recipes_url}?limit=6', None)]),
+            BenchmarkCase('recipes_list_filtered_authenticated', reader, [
+                ('get', f'{recipes_url}?limit=6&is_favorited=1{tag_filter}',
+                 None),
+            ]),
+            BenchmarkCase('recipe_detail_anonymous', None,
+                          [('get', recipe_url, None)]),
+            BenchmarkCase('recipe_detail_authenticated', reader,
+                          [('get', recipe_url, None)]),
+            BenchmarkCase('recipe_create', reader,
+                          [('post', recipes_url, recipe_data)]),
+            BenchmarkCase('recipe_update', recipe.author, [
+                ('patch', recipe_url,
+                 {key: value for key, value in recipe_data.items()
+                  if key != 'image'}),
+            ]),
+            BenchmarkCase('ingredient_search', None, [
+                ('get', f'/api/ingredients/?name={ingredients[0].name[:3]}',
+                 None),
+            ]),
+            BenchmarkCase('subscriptions', reader, [
+                ('get', '/api/users/subscriptions/?limit=6&recipes_limit=3',
+                 None),
+            ]),
+            BenchmarkCase('favorite_toggle', reader, [
+                ('post', f'{toggled_url}favorite/', None),
+                ('delete', f'{toggled_url}favorite/', None),
+            ]),
+            BenchmarkCase('shopping_cart_toggle', reader, [
+                ('post', f'{toggled_url}shopping_cart/', None),
+                ('delete', f'{toggled_url}shopping_cart/', None),
+            ]),
+            BenchmarkCase('shopping_cart_download', cart_owner, [
+                ('get', f'{recipes_url}download_shopping_cart/', None),
+            ]),
+        ]
+
+    def benchmark(self, case: BenchmarkCase,
+                  iterations: int) -> Dict[str, float]:
+        client = APIClient()
+        if case.user is not None:
+            client.force_authenticate(case.user)
+        _, queries = self.run_case(client, case)
+        timings = []
+        for _ in range(iterations):
+            elapsed, queries = self.run_case(client, case)
+            timings.append(elapsed * 1000)
+        tracemalloc.start()
+        self.run_case(client, case)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.sort()
+        return {
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[max(0, int(len(timings) * 0.95) - 1)],
+            'queries': queries,
+            'peak_kib': peak / 1024,
+        }
+
+    def run_case(self, client: APIClient,
+                 case: BenchmarkCase) -> Tuple[float, int]:
+        """Returns the wall time and the number of queries of the steps."""
+        clear_caches()
+        with transaction.atomic(), CaptureQueriesContext(
+            connection
+        ) as queries:
+            try:
+                elapsed = run_steps(client, case.steps)
+            except CommandError as error:
+                raise CommandError(f'{case.name}: {error}')
+            transaction.set_rollback(True)
+        return elapsed, len(queries)
+
+    @staticmethod
+    def compare(results: Dict[str, Dict[str, float]],
+                baseline: Dict[str, Dict[str, float]],
+                threshold: float) -> List[str]:
+        regressions = []
+        factor = 1 + threshold / 100
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append(f'{name}: {result["queries"]} queries, '
+                                   f'baseline {base["queries"]}')
+            for metric in ('median_ms', 'peak_kib'):
+                if result[metric] > base[metric] * factor:
+                    regressions.append(
+                        f'{name}: {metric} {result[metric]:.1f}, '
+                        f'baseline {base[metric]:.1f}'
+                    )
+        return regressions
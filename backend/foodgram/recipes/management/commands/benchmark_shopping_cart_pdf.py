@@ -0,0 +1,88 @@
+import resource
+import statistics
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from recipes.services import ShoppingCartRenderer, get_shopping_cart_renderer
+
+RENDERERS = (
+    'recipes.services.FpdfShoppingCartRenderer',
+    'recipes.services.PdfkitShoppingCartRenderer',
+)
+
+
+class Command(BaseCommand):
+    help = '''
+    Compares latency and peak memory of the shopping list PDF renderers
+    on a synthetic list of ingredients.
+    Peak memory is the tracemalloc peak of this process, child RSS is
+    the peak resident size of subprocesses such as wkhtmltopdf.
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--rows', type=int, default=50,
+                            help='Number of ingredients in the list')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--renderers', nargs='+', default=RENDERERS,
+                            help='Dotted paths of renderer classes')
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        unique_ingredients = self.get_unique_ingredients(options['rows'])
+        self.stdout.write(
+            f'{"renderer":<30} {"median ms":>10} {"p95 ms":>10} '
+            f'{"peak KiB":>10} {"child RSS KiB":>14} {"size KiB":>10}'
+        )
+        for path in options['renderers']:
+            renderer = get_shopping_cart_renderer(path)
+            try:
+                result = self.benchmark(renderer, unique_ingredients,
+                                        options['iterations'])
+            except OSError as error:
+                self.stdout.write(f'{path.rsplit(".", 1)[-1]:<30} '
+                                  f'skipped: {error}')
+                continue
+            self.stdout.write(
+                f'{path.rsplit(".", 1)[-1]:<30} '
+                f'{result["median_ms"]:>10.1f} {result["p95_ms"]:>10.1f} '
+                f'{result["peak_kib"]:>10.0f} '
+                f'{result["child_rss_kib"]:>14.0f} '
+                f'{result["size_kib"]:>10.1f}'
+            )
+        return 'Done.'
+
+    def benchmark(self, renderer: ShoppingCartRenderer,
+                  unique_ingredients: List[dict],
+                  iterations: int) -> Dict[str, float]:
+        pdf = renderer.render(unique_ingredients)
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            renderer.render(unique_ingredients)
+            timings.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        renderer.render(unique_ingredients)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.sort()
+        return {
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[int(len(timings) * 0.95) - 1],
+            'peak_kib': peak / 1024,
+            'child_rss_kib': resource.getrusage(
+                resource.RUSAGE_CHILDREN
+            ).ru_maxrss,
+            'size_kib': len(pdf) / 1024,
+        }
+
+    def get_unique_ingredients(self, rows: int) -> List[dict]:
+        return [
+            {
+                'ingredient__name': f'ингредиент номер {i}',
+                'ingredient__measurement_unit': 'г',
+                'total_amount': i * 10,
+            }
+            for i in range(1, rows + 1)
+        ]
@@ -0,0 +1,207 @@
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+from django.db.models import BooleanField, Count, F, Value
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.renderers import RawJSONRenderer
+from recipes.benchmarking import isolated_environment
+from recipes.memberships import UserMemberships
+from recipes.models import Recipe
+from recipes.search import search_recipes
+from recipes.serializers.common import (RecipeDocumentRenderer,
+                                        RecipeDocumentSerializer,
+                                        RecipeSerializer)
+from users.serializers import (SubscriptionsListSerializer,
+                               SubscriptionsSerializer, UserListSerializer,
+                               UserSerializer)
+
+User = get_user_model()
+
+Render = Callable[[], bytes]
+
+
+class Command(BaseCommand):
+    help = '''
+    Checks that the fast read paths render exactly the bytes of the
+    serializers they replace: recipe documents built from values() rows,
+    recipe lists made of documents, including search snippets, and
+    users and subscriptions rendered from values() rows. Runs on the
+    data in the database in a transaction that is rolled back and fails
+    with the first difference of every mismatching case.
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--recipes', type=int, default=500,
+                            help='Number of latest recipes to compare')
+        parser.add_argument('--users', type=int, default=500,
+                            help='Number of latest users to compare')
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        if not Recipe.objects.exists():
+            raise CommandError('There are no recipes to compare.')
+        failures = []
+        with isolated_environment():
+            for name, fast, reference in self.get_cases(
+                options['recipes'], options['users']
+            ):
+                fast_time, fast_output = self.measure(fast)
+                reference_time, reference_output = self.measure(reference)
+                difference = self.describe_difference(fast_output,
+                                                      reference_output)
+                self.stdout.write(
+                    f'{name:<45} {"ok" if difference is None else "DIFF":>4}'
+                    f' {fast_time * 1000:>9.1f} ms'
+                    f' {reference_time * 1000:>9.1f} ms'
+                )
+                if difference is not None:
+                    failures.append(f'{name}: {difference}')
+        if failures:
+            raise CommandError('Fast paths differ from serializers:\n'
+                               + '\n'.join(failures))
+        return 'Fast paths match serializers.'
+
+    def get_cases(self, recipes_number: int,
+                  users_number: int) -> List[Tuple[str, Render, Render]]:
+        recipe_ids = list(Recipe.objects.values_list(
+            'pk', flat=True
+        )[:recipes_number])
+        reader = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'pk').first()
+        word = Recipe.objects.values_list('name', flat=True)[0].split()[0]
+        cases = [(
+            'recipe documents',
+            lambda: self.render_documents(recipe_ids),
+            lambda: self.render_documents_with_serializer(recipe_ids),
+        )]
+        for user in (AnonymousUser(), reader):
+            label = 'anonymous' if user.is_anonymous else 'reader'
+            for search in (None, word):
+                suffix = '' if search is None else f', search={search}'
+                cases.append((
+                    f'recipes ({label}{suffix})',
+                    self.make_recipes_render(user, recipe_ids, search, True),
+                    self.make_recipes_render(user, recipe_ids, search, False),
+                ))
+            cases.append((
+                f'users ({label})',
+                self.make_users_render(user, users_number, True),
+                self.make_users_render(user, users_number, False),
+            ))
+        for recipes_limit in (None, 1):
+            cases.append((
+                f'subscriptions (recipes_limit={recipes_limit})',
+                self.make_subscriptions_render(reader, recipes_limit, True),
+                self.make_subscriptions_render(reader, recipes_limit, False),
+            ))
+        return cases
+
+    @staticmethod
+    def measure(render: Render) -> Tuple[float, bytes]:
+        started = time.perf_counter()
+        output = render()
+        return time.perf_counter() - started, output
+
+    @staticmethod
+    def describe_difference(fast: bytes, reference: bytes) -> Optional[str]:
+        if fast == reference:
+            return None
+        position = next(
+            (i for i, (a, b) in enumerate(zip(fast, reference)) if a != b),
+            min(len(fast), len(reference)),
+        )
+        start = max(position - 60, 0)
+        return (f'at byte {position}\n'
+                f'  fast:      {fast[start:position + 60]!r}\n'
+                f'  reference: {reference[start:position + 60]!r}')
+
+    @staticmethod
+    def render_documents(recipe_ids: List[int]) -> bytes:
+        bodies = RecipeDocumentRenderer.render_many(recipe_ids)
+        return '\n'.join(bodies[pk] for pk in recipe_ids).encode()
+
+    @staticmethod
+    def render_documents_with_serializer(recipe_ids: List[int]) -> bytes:
+        recipes = Recipe.objects.filter(pk__in=recipe_ids).select_related(
+            'author'
+        ).prefetch_related(*RecipeDocumentRenderer.get_prefetches())
+        bodies = {
+            recipe.pk: RecipeDocumentRenderer.render_with_serializer(recipe)
+            for recipe in recipes
+        }
+        return '\n'.join(bodies[pk] for pk in recipe_ids).encode()
+
+    @staticmethod
+    def get_context(user: User) -> dict:
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        return {
+            'request': request,
+            'memberships': UserMemberships.get(user),
+        }
+
+    def make_recipes_render(self, user: User, recipe_ids: List[int],
+                            search: Optional[str], fast: bool) -> Render:
+        def render() -> bytes:
+            queryset = Recipe.objects.filter(pk__in=recipe_ids)
+            if search is not None:
+                queryset = search_recipes(queryset, search, highlight=True)
+            context = self.get_context(user)
+            if fast:
+                queryset = queryset.select_related('document')
+                return RawJSONRenderer().render(RecipeDocumentSerializer(
+                    queryset, many=True, context=context
+                ).data)
+            queryset = queryset.select_related('author').prefetch_related(
+                *RecipeDocumentRenderer.get_prefetches()
+            )
+            return JSONRenderer().render(RecipeSerializer(
+                queryset, many=True, context=context
+            ).data)
+
+        return render
+
+    def make_users_render(self, user: User, users_number: int,
+                          fast: bool) -> Render:
+        def render() -> bytes:
+            queryset = User.objects.all()[:users_number]
+            context = self.get_context(user)
+            if fast:
+                return RawJSONRenderer().render(UserSerializer(
+                    queryset.values(*UserListSerializer.VALUES), many=True,
+                    context=context,
+                ).data)
+            return JSONRenderer().render(UserSerializer(
+                list(queryset), many=True, context=context
+            ).data)
+
+        return render
+
+    def make_subscriptions_render(self, user: User,
+                                  recipes_limit: Optional[int],
+                                  fast: bool) -> Render:
+        def render() -> bytes:
+            queryset = User.objects.filter(following__user=user).annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+                followed_at=F('following__id'),
+            ).order_by('-followed_at')
+            context = dict(self.get_context(user),
+                           recipes_limit=recipes_limit)
+            if fast:
+                return RawJSONRenderer().render(SubscriptionsSerializer(
+                    queryset.values(*SubscriptionsListSerializer.VALUES,
+                                    'is_subscribed'),
+                    many=True, context=context,
+                ).data)
+            return JSONRenderer().render(SubscriptionsSerializer(
+                list(queryset), many=True, context=context
+            ).data)
+
+        return render
@@ -0,0 +1,314 @@
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from recipes.benchmarking import (IMAGE, Step, clear_caches,
+                                  isolated_environment, run_steps)
+from recipes.models import (CartItem, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.services import ShoppingCartTotals
+from users.models import Follow
+
+User = get_user_model()
+
+
+class World(NamedTuple):
+    """
+    Fixtures of one scale `n`: the reader follows `n` authors with `n`
+    recipes each, every recipe has `n` tags and `n` ingredients and the
+    first `n` recipes are in favorites and shopping cart of the reader.
+    `others` are `n` recipes of `other_authors[0]` that nobody links.
+    """
+    reader: User
+    superuser: User
+    authors: List[User]
+    other_authors: List[User]
+    recipes: List[Recipe]
+    others: List[Recipe]
+    tags: List[Tag]
+    ingredients: List[Ingredient]
+
+
+Case = Callable[[World, int], Tuple[Optional[User], List[Step]]]
+
+
+def get_fingerprint(sql: str) -> str:
+    """Returns `sql` with literals replaced by placeholders."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class Command(BaseCommand):
+    help = '''
+    Checks that the number of SQL queries of API actions and admin
+    changelists does not grow with the number of rows they show.
+    Every case runs at each --scales value n, with n rows per page,
+    n related rows per row and fixtures of that size, created in
+    a transaction that is rolled back. Fails with fingerprints of the
+    queries that were repeated per row.
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--scales', nargs='+', type=int,
+                            default=[1, 5, 20])
+        parser.add_argument('--cases', nargs='+',
+                            help='Names of cases to run, all by default')
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        scales = sorted(set(options['scales']))
+        if len(scales) < 2:
+            raise CommandError('At least two scales are needed.')
+        cases = self.get_cases()
+        if options['cases']:
+            unknown = set(options['cases']) - set(cases)
+            if unknown:
+                raise CommandError(f'Unknown cases: {", ".join(unknown)}')
+            cases = {name: cases[name] for name in options['cases']}
+        queries: Dict[str, Dict[int, List[str]]] = {name: {} for name in cases}
+        list_per_page = {model_admin: model_admin.list_per_page
+                         for model_admin in admin.site._registry.values()}
+        try:
+            with isolated_environment():
+                for scale in scales:
+                    with transaction.atomic():
+                        world = self.create_world(scale)
+                        for name, case in cases.items():
+                            queries[name][scale] = self.run_case(
+                                name, case, world, scale
+                            )
+                        transaction.set_rollback(True)
+        finally:
+            for model_admin, per_page in list_per_page.items():
+                model_admin.list_per_page = per_page
+        failures = []
+        self.stdout.write(f'{"case":<40} ' + ' '.join(
+            f'{f"n={scale}":>6}' for scale in scales
+        ))
+        for name, scale_queries in queries.items():
+            counts = [len(scale_queries[scale]) for scale in scales]
+            self.stdout.write(f'{name:<40} ' + ' '.join(
+                f'{count:>6}' for count in counts
+            ))
+            if len(set(counts)) > 1:
+                failures.append(self.describe_failure(
+                    name, scale_queries[scales[0]], scale_queries[scales[-1]]
+                ))
+        if failures:
+            raise CommandError('Query count grows with rows:\n'
+                               + '\n'.join(failures))
+        return 'Query counts are constant.'
+
+    def run_case(self, name: str, case: Case, world: World,
+                 scale: int) -> List[str]:
+        with transaction.atomic():
+            user, steps = case(world, scale)
+            client = APIClient()
+            if user is not None:
+                client.force_authenticate(user)
+                client.force_login(user)
+            clear_caches()
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    run_steps(client, steps)
+                except CommandError as error:
+                    raise CommandError(f'{name} with n={scale}: {error}')
+            transaction.set_rollback(True)
+        return [query['sql'] for query in queries.captured_queries]
+
+    @staticmethod
+    def describe_failure(name: str, small: List[str],
+                         large: List[str]) -> str:
+        grown = Counter(map(get_fingerprint, large))
+        grown.subtract(Counter(map(get_fingerprint, small)))
+        lines = [f'{name}:']
+        for fingerprint, count in grown.most_common():
+            if count <= 0:
+                break
+            lines.append(f'  +{count} {fingerprint[:300]}')
+        return '\n'.join(lines)
+
+    def create_world(self, scale: int) -> World:
+        prefix = f'scaling{scale}_'
+
+        def create_user(name: str, **fields: Any) -> User:
+            return User.objects.create(username=f'{prefix}{name}',
+                                       email=f'{prefix}{name}@example.org',
+                                       password='!', **fields)
+
+        def create_recipes(author: User) -> List[Recipe]:
+            recipes = [
+                Recipe.objects.create(author=author, name=f'{prefix}{i}',
+                                      text='text', cooking_time=10)
+                for i in range(scale)
+            ]
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe=recipe, tag=tag)
+                for recipe in recipes for tag in tags
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for recipe in recipes for ingredient in ingredients
+            )
+            return recipes
+
+        for i in range(scale):
+            Tag.objects.create(name=f'{prefix}{i}', color=f'#{scale:03}{i:03}',
+                               slug=f'{prefix}{i}')
+            Ingredient.objects.create(name=f'{prefix}{i}',
+                                      measurement_unit='г')
+        tags = list(Tag.objects.filter(slug__startswith=prefix))
+        ingredients = list(Ingredient.objects.filter(name__startswith=prefix))
+        reader = create_user('reader')
+        superuser = create_user('admin', is_staff=True, is_superuser=True)
+        authors = [create_user(f'author{i}') for i in range(scale)]
+        other_authors = [create_user(f'other{i}') for i in range(scale)]
+        recipes = [recipe for author in authors
+                   for recipe in create_recipes(author)]
+        others = create_recipes(other_authors[0])
+        for author in authors:
+            Follow.objects.create(user=reader, following=author)
+        for recipe in recipes[:scale]:
+            Favorite.objects.create(owner=reader, recipe=recipe)
+            CartItem.objects.create(owner=reader, recipe=recipe)
+        ShoppingCartTotals.rebuild(owner_ids=[reader.pk])
+        return World(reader, superuser, authors, other_authors, recipes,
+                     others, tags, ingredients)
+
+    def get_cases(self) -> Dict[str, Case]:
+        cases = {
+            'recipes.list': lambda world, n: (None, [
+                ('get', f'/api/recipes/?limit={n}', None),
+            ]),
+            'recipes.list_authenticated': lambda world, n: (world.reader, [
+                ('get', f'/api/recipes/?limit={n}', None),
+            ]),
+            'recipes.list_cursor': lambda world, n: (world.reader, [
+                ('get', f'/api/recipes/?cursor=&limit={n}', None),
+            ]),
+            'recipes.list_filtered': lambda world, n: (world.reader, [
+                ('get', f'/api/recipes/?limit={n}&is_favorited=1'
+                        f'&is_in_shopping_cart=1&tags={world.tags[0].slug}',
+                 None),
+            ]),
+            'recipes.list_author': lambda world, n: (world.reader, [
+                ('get', f'/api/recipes/?limit={n}'
+                        f'&author={world.authors[0].pk}', None),
+            ]),
+            'recipes.retrieve': lambda world, n: (world.reader, [
+                ('get', f'/api/recipes/{world.recipes[0].pk}/', None),
+            ]),
+            'recipes.create': lambda world, n: (world.reader, [
+                ('post', '/api/recipes/', self.get_recipe_data(world, True)),
+            ]),
+            'recipes.partial_update': lambda world, n: (world.authors[0], [
+                ('patch', f'/api/recipes/{world.recipes[0].pk}/',
+                 self.get_recipe_data(world, False)),
+            ]),
+            'recipes.destroy': lambda world, n: (world.authors[0], [
+                ('delete', f'/api/recipes/{world.recipes[0].pk}/', None),
+            ]),
+            'recipes.favorite': lambda world, n: (world.reader, [
+                ('post', f'/api/recipes/{world.others[0].pk}/favorite/',
+                 None),
+                ('delete', f'/api/recipes/{world.others[0].pk}/favorite/',
+                 None),
+            ]),
+            'recipes.shopping_cart': lambda world, n: (world.reader, [
+                ('post', f'/api/recipes/{world.others[0].pk}/shopping_cart/',
+                 None),
+                ('delete',
+                 f'/api/recipes/{world.others[0].pk}/shopping_cart/', None),
+            ]),
+            'recipes.bulk_favorite': lambda world, n: (world.reader, [
+                ('post', '/api/recipes/favorite/', self.get_ids(world.others)),
+                ('delete', '/api/recipes/favorite/',
+                 self.get_ids(world.others)),
+            ]),
+            'recipes.bulk_shopping_cart': lambda world, n: (world.reader, [
+                ('post', '/api/recipes/shopping_cart/',
+                 self.get_ids(world.others)),
+                ('delete', '/api/recipes/shopping_cart/',
+                 self.get_ids(world.others)),
+            ]),
+            'recipes.download_shopping_cart': lambda world, n: (
+                world.reader,
+                [('get', '/api/recipes/download_shopping_cart/', None)],
+            ),
+            'recipes.shopping_cart_summary': lambda world, n: (world.reader, [
+                ('get', '/api/recipes/shopping_cart_summary/', None),
+            ]),
+            'users.list': lambda world, n: (None, [
+                ('get', f'/api/users/?limit={n}', None),
+            ]),
+            'users.list_authenticated': lambda world, n: (world.reader, [
+                ('get', f'/api/users/?limit={n}', None),
+            ]),
+            'users.retrieve': lambda world, n: (world.reader, [
+                ('get', f'/api/users/{world.authors[0].pk}/', None),
+            ]),
+            'users.me': lambda world, n: (world.reader, [
+                ('get', '/api/users/me/', None),
+            ]),
+            'users.subscriptions': lambda world, n: (world.reader, [
+                ('get', f'/api/users/subscriptions/?limit={n}'
+                        f'&recipes_limit={n}', None),
+            ]),
+            'users.subscribe': lambda world, n: (world.reader, [
+                ('post', f'/api/users/{world.other_authors[0].pk}/subscribe/',
+                 None),
+                ('delete',
+                 f'/api/users/{world.other_authors[0].pk}/subscribe/', None),
+            ]),
+            'users.bulk_subscribe': lambda world, n: (world.reader, [
+                ('post', '/api/users/subscribe/',
+                 self.get_ids(world.other_authors)),
+                ('delete', '/api/users/subscribe/',
+                 self.get_ids(world.other_authors)),
+            ]),
+        }
+        for model, model_admin in admin.site._registry.items():
+            cases[f'admin.{model._meta.label_lower}'] = (
+                self.get_changelist_case(model, model_admin)
+            )
+        return cases
+
+    @staticmethod
+    def get_changelist_case(model, model_admin: admin.ModelAdmin) -> Case:
+        url = reverse(f'admin:{model._meta.app_label}_'
+                      f'{model._meta.model_name}_changelist')
+
+        def case(world: World, scale: int) -> Tuple[User, List[Step]]:
+            model_admin.list_per_page = scale
+            return world.superuser, [('get', url, None)]
+
+        return case
+
+    @staticmethod
+    def get_ids(objects: List[Any]) -> Dict[str, List[int]]:
+        return {'ids': [obj.pk for obj in objects]}
+
+    @staticmethod
+    def get_recipe_data(world: World, with_image: bool) -> Dict[str, Any]:
+        data = {
+            'tags': [tag.pk for tag in world.tags],
+            'ingredients': [{'id': ingredient.pk, 'amount': 5}
+                            for ingredient in world.ingredients],
+            'name': 'Scaling recipe',
+            'text': 'text',
+            'cooking_time': 5,
+        }
+        if with_image:
+            data['image'] = IMAGE
+        return data
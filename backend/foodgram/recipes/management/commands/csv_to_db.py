@@ -1,37 +1,110 @@
 import csv
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Set, Tuple,
+                    Type)
 
+import django
 from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand, CommandParser
+from django.contrib.auth.hashers import (UNUSABLE_PASSWORD_PREFIX,
+                                         identify_hasher, make_password)
+from django.core.management.base import (BaseCommand, CommandParser,
+                                         OutputWrapper)
+from django.db import transaction
 from django.db.models import Model
 
+from core.loading import insert_ignore_conflicts
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.services import BulkLoadRefresh
 
 User = get_user_model()
 
 logger = logging.getLogger(__name__)
 
+Row = Dict[str, str]
+
+
+def get_available_cpus() -> int:
+    """Returns the number of cores the process is allowed to run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
 
 class CsvToDb:
     """
-    To add a new model, write the csv_to_model_name method.
+    Streams csv files into the database.
+
+    To add a new model, write the csv_to_model_name method, which
+    gets a chunk of csv rows and writes them with `insert`.
     The order of the methods is important,
     tables will be added in this order.
+
+    Every table is loaded in its own transaction, foreign keys are
+    resolved through name -> id maps loaded once per table and rows
+    that already exist are skipped, so the load can be repeated.
     """
 
-    @classmethod
-    def parse_tables(cls, tables: List[str], path: str) -> None:
-        for table in tables:
-            file_path = Path(path, f'{table}.csv')
-            with open(file_path, encoding='utf-8-sig') as fp:
-                reader = csv.reader(fp, delimiter=",", quotechar='"')
-                headers: List[str] = next(reader, list())
-                data = [
-                    {header: row[i] for i, header in enumerate(headers)}
-                    for row in reader]
-                getattr(cls, f'csv_to_{table}')(data)
+    def __init__(self, path: str, chunk_size: int = 5000,
+                 stdout: Optional[OutputWrapper] = None,
+                 hashed_passwords: bool = False,
+                 workers: Optional[int] = None) -> None:
+        self.path: str = path
+        self.chunk_size: int = chunk_size
+        self.hashed_passwords: bool = hashed_passwords
+        self.workers: Optional[int] = workers
+        self.stdout: Optional[OutputWrapper] = stdout
+        self.skipped: int = 0
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.loaded: BulkLoadRefresh = BulkLoadRefresh()
+        # Maps are loaded when their table starts, after the previous
+        # tables of the same run are written.
+        self.user_emails: Optional[Set[str]] = None
+        self.usernames: Optional[Set[str]] = None
+        self.ingredient_keys: Optional[Set[Tuple[str, str]]] = None
+        self.author_ids: Optional[Set[int]] = None
+        self.tag_ids: Optional[Set[int]] = None
+        self.recipe_keys: Optional[Dict[Tuple[int, str], int]] = None
+        self.ingredient_ids: Optional[Dict[str, int]] = None
+        self.recipe_ids: Optional[Set[int]] = None
+
+    def parse_tables(self, tables: List[str], dry_run: bool = False) -> None:
+        """
+        Loads `tables` in order. With `dry_run` rows are validated and
+        written in a transaction that is rolled back.
+        """
+        try:
+            if dry_run:
+                with transaction.atomic():
+                    for table in tables:
+                        self.parse_table(table)
+                    transaction.set_rollback(True)
+                return
+            for table in tables:
+                self.parse_table(table)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+        self.loaded.refresh()
+
+    def parse_table(self, table: str) -> None:
+        load_chunk = getattr(self, f'csv_to_{table}')
+        self.skipped = 0
+        rows = 0
+        started = time.monotonic()
+        with transaction.atomic():
+            for chunk in self._read_chunks(Path(self.path, f'{table}.csv')):
+                load_chunk(chunk)
+                rows += len(chunk)
+                self._report(f'{table}: {rows} rows', rows, started)
+        self._report(
+            f'{table}: {rows} rows done, {self.skipped} skipped', rows, started
+        )
 
     @classmethod
     def get_avaiable_tables(cls) -> List[str]:
@@ -48,60 +121,200 @@ class CsvToDb:
         order = {table: i for i, table in enumerate(avaiable_tables)}
         return sorted(tables, key=lambda x: order.get(x, float('inf')))
 
-    @classmethod
-    def _save_instance(cls, model_class: Model,
-                       instance: Dict[str, str]) -> None:
-        obj, status = model_class.objects.get_or_create(**instance)
-        created = 'created' if status else 'not created'
-        logger.info(f'{model_class.__name__} {obj} is {created}')
+    def _read_chunks(self, file_path: Path) -> Iterator[List[Row]]:
+        with open(file_path, encoding='utf-8-sig', newline='') as fp:
+            reader = csv.DictReader(fp, delimiter=',', quotechar='"')
+            while True:
+                chunk = list(islice(reader, self.chunk_size))
+                if not chunk:
+                    return
+                yield chunk
 
-    @classmethod
-    def csv_to_users(cls, data: List[Dict[str, str]]) -> None:
-        for instance in data:
-            user = User.objects.create_user(**instance)
-            logger.info(f'User {user} is created')
+    def _report(self, message: str, rows: int, started: float) -> None:
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else 0
+        line = f'{message} in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        if self.stdout is not None:
+            self.stdout.write(line)
+        else:
+            logger.info(line)
 
-    @classmethod
-    def csv_to_ingredients(cls, data: List[Dict[str, str]]) -> None:
-        for instance in data:
-            cls._save_instance(Ingredient, instance)
+    def build(self, rows: List[Row],
+              build_row: Callable[[Row], Optional[Model]]) -> List[Model]:
+        """
+        Returns instances built from `rows`. `build_row` raises
+        ValueError for invalid rows, which are skipped with a warning,
+        and returns None for rows that already exist.
+        """
+        instances = []
+        for row in rows:
+            try:
+                instance = build_row(row)
+            except (KeyError, TypeError, ValueError) as error:
+                self.skipped += 1
+                logger.warning(f'Row {row} is skipped: {error!r}')
+                continue
+            if instance is not None:
+                instances.append(instance)
+        return instances
 
-    @classmethod
-    def csv_to_tags(cls, data: List[Dict[str, str]]) -> None:
-        for instance in data:
-            cls._save_instance(Tag, instance)
+    def insert(self, model: Type[Model], instances: List[Model]) -> None:
+        """Writes `instances`, skipping conflicting rows."""
+        insert_ignore_conflicts(model, instances)
+        self.loaded.add(model, instances)
 
-    @classmethod
-    def csv_to_recipes(cls, data: List[Dict[str, str]]) -> None:
-        for instance in data:
-            tags_id = [int(tag) for tag in instance.pop('tags_id').split(',')]
-            obj, status = Recipe.objects.get_or_create(**instance)
-            if status:
-                obj.tags.set(tags_id)
-            created = 'created' if status else 'not created'
-            logger.info(f'Recipe {obj} is {created}')
+    def make_passwords(self, passwords: List[str]) -> List[str]:
+        """
+        Returns hashes of `passwords` in the same order. Hashing is
+        CPU-bound, so it runs in a pool of `workers` processes, one per
+        available core by default, which is shared by the chunks.
+        """
+        workers = self.workers or get_available_cpus()
+        if workers == 1 or len(passwords) < 2:
+            return [make_password(password) for password in passwords]
+        if self.executor is None:
+            # Spawned workers start without configured apps.
+            self.executor = ProcessPoolExecutor(workers,
+                                                initializer=django.setup)
+        return list(self.executor.map(
+            make_password, passwords,
+            chunksize=max(1, len(passwords) // (workers * 4)),
+        ))
 
-    @classmethod
-    def csv_to_recipes_ingredients(cls, data: List[Dict[str, str]]) -> None:
-        for instance in data:
-            ingredient_name = instance.pop('ingredient_name')
-            try:
-                ingredient = Ingredient.objects.get(name=ingredient_name)
-            except Ingredient.DoesNotExists:
-                logger.warning(
-                    f'RecipeIngredient.'
-                    f'Cannot create m2m relation, '
-                    f'cause ingredient_name {ingredient_name} does not exists.'
+    def csv_to_users(self, rows: List[Row]) -> None:
+        """
+        Passwords are hashed in a process pool, unless they are hashes
+        exported from another instance with the same hashers.
+        """
+        if self.user_emails is None:
+            self.user_emails = set(User.objects.values_list('email',
+                                                            flat=True))
+            self.usernames = set(User.objects.values_list('username',
+                                                          flat=True))
+
+        def build_user(row: Row) -> User:
+            email = User.objects.normalize_email(row['email'])
+            username = User.normalize_username(row['username'])
+            if email in self.user_emails:
+                raise ValueError(f'email {email} already exists')
+            if username in self.usernames:
+                raise ValueError(f'username {username} already exists')
+            # The username_is_not_me constraint.
+            if username.lower() == 'me':
+                raise ValueError(f'username {username} is not allowed')
+            password = row['password']
+            if (self.hashed_passwords
+                    and not password.startswith(UNUSABLE_PASSWORD_PREFIX)):
+                identify_hasher(password)
+            self.user_emails.add(email)
+            self.usernames.add(username)
+            return User(email=email, username=username,
+                        first_name=row['first_name'],
+                        last_name=row['last_name'], password=password)
+
+        users = self.build(rows, build_user)
+        if not self.hashed_passwords:
+            passwords = self.make_passwords([user.password
+                                             for user in users])
+            for user, password in zip(users, passwords):
+                user.password = password
+        self.insert(User, users)
+
+    def csv_to_ingredients(self, rows: List[Row]) -> None:
+        if self.ingredient_keys is None:
+            self.ingredient_keys = set(
+                Ingredient.objects.values_list('name', 'measurement_unit')
+            )
+
+        def build_ingredient(row: Row) -> Optional[Ingredient]:
+            key = (row['name'], row['measurement_unit'])
+            if key in self.ingredient_keys:
+                return None
+            self.ingredient_keys.add(key)
+            return Ingredient(name=key[0], measurement_unit=key[1])
+
+        self.insert(Ingredient, self.build(rows, build_ingredient))
+
+    def csv_to_tags(self, rows: List[Row]) -> None:
+        self.insert(Tag, self.build(rows, lambda row: Tag(**row)))
+
+    def csv_to_recipes(self, rows: List[Row]) -> None:
+        if self.recipe_keys is None:
+            self.author_ids = set(User.objects.values_list('id', flat=True))
+            self.tag_ids = set(Tag.objects.values_list('id', flat=True))
+            self.recipe_keys = {
+                (author_id, name): pk for author_id, name, pk
+                in Recipe.objects.values_list('author_id', 'name', 'id')
+            }
+        recipe_tags: Dict[Tuple[int, str], List[int]] = {}
+
+        def build_recipe(row: Row) -> Optional[Recipe]:
+            key = (int(row['author_id']), row['name'])
+            if key[0] not in self.author_ids:
+                raise ValueError(f'author_id {key[0]} does not exist')
+            tag_ids = [int(tag) for tag in row['tags_id'].split(',')]
+            if not self.tag_ids.issuperset(tag_ids):
+                raise ValueError(f'tags_id {row["tags_id"]} do not exist')
+            cooking_time = int(row['cooking_time'])
+            if cooking_time < 1:
+                raise ValueError('cooking_time must be >= 1')
+            if key in self.recipe_keys or key in recipe_tags:
+                return None
+            recipe_tags[key] = tag_ids
+            return Recipe(author_id=key[0], name=key[1], text=row['text'],
+                          cooking_time=cooking_time)
+
+        self.insert(Recipe, self.build(rows, build_recipe))
+        if not recipe_tags:
+            return
+        # Ids are not returned by bulk inserts on every backend.
+        self.recipe_keys.update(
+            ((author_id, name), pk) for author_id, name, pk
+            in Recipe.objects.filter(
+                author_id__in={author_id for author_id, _ in recipe_tags},
+                name__in={name for _, name in recipe_tags},
+            ).values_list('author_id', 'name', 'id')
+        )
+        self.insert(Recipe.tags.through, [
+            Recipe.tags.through(recipe_id=self.recipe_keys[key], tag_id=tag_id)
+            for key, tag_ids in recipe_tags.items()
+            for tag_id in tag_ids
+        ])
+
+    def csv_to_recipes_ingredients(self, rows: List[Row]) -> None:
+        if self.ingredient_ids is None:
+            # The first ingredient wins if names repeat with other units.
+            self.ingredient_ids = dict(Ingredient.objects.order_by(
+                '-id'
+            ).values_list('name', 'id'))
+            self.recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+
+        def build_recipe_ingredient(row: Row) -> RecipeIngredient:
+            recipe_id = int(row['recipe_id'])
+            if recipe_id not in self.recipe_ids:
+                raise ValueError(f'recipe_id {recipe_id} does not exist')
+            ingredient_id = self.ingredient_ids.get(row['ingredient_name'])
+            if ingredient_id is None:
+                raise ValueError(
+                    f'ingredient_name {row["ingredient_name"]} does not exist'
                 )
-            else:
-                instance['ingredient'] = ingredient
-                cls._save_instance(RecipeIngredient, instance)
+            amount = int(row['amount'])
+            if amount < 1:
+                raise ValueError('amount must be >= 1')
+            return RecipeIngredient(recipe_id=recipe_id,
+                                    ingredient_id=ingredient_id,
+                                    amount=amount)
+
+        self.insert(RecipeIngredient,
+                    self.build(rows, build_recipe_ingredient))
 
 
 class Command(BaseCommand):
     help = '''
     Fills db from csv.
     Names must be similar to model names.
+    Files are read in chunks and every table is loaded in one transaction
+    with bulk inserts, or COPY on PostgreSQL.
     '''
 
     def add_arguments(self, parser: CommandParser) -> None:
@@ -114,13 +327,28 @@ class Command(BaseCommand):
         )
         parser.add_argument('tables', nargs='+', type=str,
                             choices=choices, default='all')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of rows read and written at once')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate rows and roll back the load')
+        parser.add_argument('--hashed-passwords', action='store_true',
+                            help='Passwords in users.csv are already '
+                                 'hashed by another Django instance')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of password hashing processes, '
+                                 'the number of available cores by '
+                                 'default')
 
     def handle(self, *args: Any, **options: Any) -> str:
         if 'all' in options['tables']:
             tables = CsvToDb.get_avaiable_tables()
         else:
             tables = CsvToDb.sort_tables(options['tables'])
-        CsvToDb.parse_tables(tables, options['path'])
-        if tables:
-            return f'{tables} are added!'
-        return 'tables are empty.'
+        loader = CsvToDb(options['path'], options['chunk_size'], self.stdout,
+                         options['hashed_passwords'], options['workers'])
+        loader.parse_tables(tables, options['dry_run'])
+        if not tables:
+            return 'tables are empty.'
+        if options['dry_run']:
+            return f'{tables} are checked, nothing is saved.'
+        return f'{tables} are added!'
@@ -0,0 +1,275 @@
+import random
+import time
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser, OutputWrapper)
+from django.db import transaction
+from django.db.models import Model
+
+from core.loading import insert_ignore_conflicts
+from recipes.models import (CartItem, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.services import BulkLoadRefresh
+from users.models import Follow
+
+User = get_user_model()
+
+Population = Tuple[List[int], List[float]]
+
+
+class SyntheticDataGenerator:
+    """
+    Generates a reproducible dataset of the given size for scale testing.
+
+    Popularity of recipes, authors, tags and ingredients follows Zipf's
+    law and activity of users (favorites, cart items and follows) has
+    a Pareto tail, so a few recipes and authors get most of the rows.
+    Names of generated users, tags and recipes start with
+    `synthetic<seed>_`. Ingredients are taken from the database.
+    """
+    ZIPF_EXPONENT: float = 1.1
+    ACTIVITY_ALPHA: float = 1.2
+    PASSWORD: str = 'synthetic'
+    DEFAULT_SIZES: Dict[str, int] = {
+        'users': 1_000,
+        'tags': 20,
+        'recipes': 5_000,
+        'follows': 20_000,
+        'favorites': 100_000,
+        'cart_items': 20_000,
+    }
+
+    def __init__(self, seed: int, batch_size: int,
+                 stdout: OutputWrapper) -> None:
+        self.random: random.Random = random.Random(seed)
+        self.prefix: str = f'synthetic{seed}_'
+        self.batch_size: int = batch_size
+        self.stdout: OutputWrapper = stdout
+        self.words: List[str] = []
+        self.loaded: BulkLoadRefresh = BulkLoadRefresh()
+
+    def generate(self, users: int, tags: int, recipes: int, follows: int,
+                 favorites: int, cart_items: int) -> None:
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Data with prefix {self.prefix} already exists.'
+            )
+        ingredient_ids = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+        if not ingredient_ids:
+            raise CommandError(
+                'Ingredients are empty, load them with csv_to_db first.'
+            )
+        if recipes and not users:
+            raise CommandError('Recipes need at least one user.')
+        self.words = self._get_words()
+        user_ids = self.generate_users(users)
+        tag_ids = self.generate_tags(tags)
+        # Prolific authors are also the most followed ones.
+        authors = self._popular(user_ids)
+        recipe_ids = self.generate_recipes(
+            recipes, authors, self._popular(tag_ids),
+            self._popular(ingredient_ids),
+        )
+        popular_recipes = self._popular(recipe_ids)
+        self.generate_pairs(Follow, 'user_id', 'following_id', follows,
+                            user_ids, authors, exclude_owner=True)
+        self.generate_pairs(Favorite, 'owner_id', 'recipe_id', favorites,
+                            user_ids, popular_recipes)
+        self.generate_pairs(CartItem, 'owner_id', 'recipe_id', cart_items,
+                            user_ids, popular_recipes)
+        self.loaded.refresh()
+
+    def generate_users(self, count: int) -> List[int]:
+        password = make_password(self.PASSWORD)
+        self._insert(User, (
+            User(
+                username=f'{self.prefix}{i}',
+                email=f'{self.prefix}{i}@example.org',
+                first_name=self.random.choice(self.words).capitalize(),
+                last_name=self.random.choice(self.words).capitalize(),
+                password=password,
+            )
+            for i in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=self.prefix
+        ).order_by('id').values_list('id', flat=True))
+
+    def generate_tags(self, count: int) -> List[int]:
+        self._insert(Tag, (
+            Tag(name=f'{self.prefix}{i}',
+                color=f'#{self.random.randrange(16 ** 6):06X}',
+                slug=f'{self.prefix}{i}')
+            for i in range(count)
+        ))
+        return list(Tag.objects.filter(
+            slug__startswith=self.prefix
+        ).order_by('id').values_list('id', flat=True))
+
+    def generate_recipes(self, count: int, authors: Population,
+                         tags: Population,
+                         ingredients: Population) -> List[int]:
+        author_ids = self.random.choices(authors[0], cum_weights=authors[1],
+                                         k=count)
+        self._insert(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=f'{self.prefix}{i} {self.random.choice(self.words)}',
+                text=' '.join(self.random.choices(
+                    self.words, k=self.random.randint(10, 80)
+                )),
+                cooking_time=min(
+                    600, max(1, int(self.random.lognormvariate(3.4, 0.6)))
+                ),
+            )
+            for i, author_id in enumerate(author_ids)
+        ))
+        recipe_ids = list(Recipe.objects.filter(
+            name__startswith=self.prefix
+        ).order_by('id').values_list('id', flat=True))
+        if tags[0]:
+            self._insert(Recipe.tags.through, (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self._sample(
+                    tags, min(len(tags[0]), self.random.randint(1, 3))
+                )
+            ))
+        self._insert(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=self.random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self._sample(
+                ingredients,
+                min(len(ingredients[0]) // 2 or 1, self.random.randint(3, 12)),
+            )
+        ))
+        return recipe_ids
+
+    def generate_pairs(self, model: Type[Model], owner_field: str,
+                       target_field: str, count: int, owner_ids: List[int],
+                       targets: Population,
+                       exclude_owner: bool = False) -> None:
+        """
+        Links owners to `count` distinct targets in total, the number
+        of links of every owner follows a Pareto distribution.
+        """
+        cap = len(targets[0]) // 2
+        counts = self._get_activity(count, len(owner_ids), cap)
+        self._insert(model, (
+            model(**{owner_field: owner_id, target_field: target_id})
+            for owner_id, owner_count in zip(owner_ids, counts)
+            if owner_count
+            for target_id in self._sample(
+                targets, owner_count, owner_id if exclude_owner else None
+            )
+        ))
+
+    def _insert(self, model: Type[Model], instances: Iterable[Model]) -> None:
+        rows = 0
+        started = time.monotonic()
+        batch = []
+        with transaction.atomic():
+            for instance in instances:
+                batch.append(instance)
+                if len(batch) == self.batch_size:
+                    insert_ignore_conflicts(model, batch)
+                    self.loaded.add(model, batch)
+                    rows += len(batch)
+                    batch = []
+                    self._report(model, rows, started)
+            insert_ignore_conflicts(model, batch)
+            self.loaded.add(model, batch)
+            rows += len(batch)
+        self._report(model, rows, started)
+
+    def _report(self, model: Type[Model], rows: int, started: float) -> None:
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f'{model._meta.db_table}: {rows} rows '
+                          f'in {elapsed:.2f}s ({rate:.0f} rows/s)')
+
+    def _popular(self, ids: List[int]) -> Population:
+        """Returns `ids` in random popularity order and Zipf weights."""
+        ids = list(ids)
+        self.random.shuffle(ids)
+        return ids, list(accumulate(
+            1 / rank ** self.ZIPF_EXPONENT for rank in range(1, len(ids) + 1)
+        ))
+
+    def _sample(self, population: Population, count: int,
+                exclude: Optional[int] = None) -> List[int]:
+        """Returns `count` distinct ids drawn by popularity."""
+        ids, cum_weights = population
+        chosen: Set[int] = set()
+        while len(chosen) < count:
+            chosen.update(self.random.choices(
+                ids, cum_weights=cum_weights, k=count - len(chosen)
+            ))
+            chosen.discard(exclude)
+        return sorted(chosen)
+
+    def _get_activity(self, total: int, owners: int, cap: int) -> List[int]:
+        """Splits `total` between `owners` with at most `cap` each."""
+        weights = [self.random.paretovariate(self.ACTIVITY_ALPHA)
+                   for _ in range(owners)]
+        counts = [0] * owners
+        remaining = min(total, owners * cap)
+        while remaining > 0:
+            # Owners over the cap give their share to the others.
+            available = [i for i in range(owners) if counts[i] < cap]
+            weight_sum = sum(weights[i] for i in available)
+            added = 0
+            for i in available:
+                share = min(cap - counts[i],
+                            int(remaining * weights[i] / weight_sum))
+                counts[i] += share
+                added += share
+            if not added:
+                for i in available[:remaining]:
+                    counts[i] += 1
+                added = min(remaining, len(available))
+            remaining -= added
+        return counts
+
+    @staticmethod
+    def _get_words() -> List[str]:
+        words = {
+            word
+            for name in Ingredient.objects.values_list('name', flat=True)
+            for word in name.split()
+            if word.isalpha()
+        }
+        return sorted(words)
+
+
+class Command(BaseCommand):
+    help = '''
+    Generates a reproducible synthetic dataset of users, follows, tags,
+    recipes, recipe ingredients, favorites and cart items for scale
+    testing. Ingredients must be loaded with csv_to_db first.
+    Every user has the password "synthetic".
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed, also used in names')
+        for name, size in SyntheticDataGenerator.DEFAULT_SIZES.items():
+            parser.add_argument(f'--{name.replace("_", "-")}', type=int,
+                                default=size)
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help='Number of rows inserted at once')
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        generator = SyntheticDataGenerator(options['seed'],
+                                           options['batch_size'], self.stdout)
+        generator.generate(options['users'], options['tags'],
+                           options['recipes'], options['follows'],
+                           options['favorites'], options['cart_items'])
+        return f'Synthetic data {generator.prefix} is generated.'
@@ -0,0 +1,27 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from recipes.services import ShoppingCartTotals
+
+
+class Command(BaseCommand):
+    help = '''
+    Recomputes shopping cart totals from cart items.
+    Use it to repair drift after carts or recipe ingredients
+    were changed outside of the API, e.g. in the admin.
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--users',
+            nargs='+',
+            type=int,
+            help='Ids of users to rebuild, everyone by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        rows = ShoppingCartTotals.rebuild(options['users'],
+                                          options['batch_size'])
+        return f'{rows} shopping cart totals are rebuilt!'
@@ -0,0 +1,17 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from recipes.services import DenormalizedCounters
+
+
+class Command(BaseCommand):
+    help = '''
+    Recomputes favorites, recipes and followers counters.
+    Use it after bulk loads or manual SQL that skip model signals.
+    '''
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        fixed = DenormalizedCounters.reconcile()
+        return ', '.join(f'{counter}: {rows} rows fixed'
+                         for counter, rows in fixed.items())
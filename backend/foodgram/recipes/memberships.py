@@ -0,0 +1,177 @@
+import time
+from array import array
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Type, Union
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import IntegerField, Model, Value
+
+from core.cache import get_versions, replace_version
+from recipes.models import CartItem, Favorite
+from users.models import Follow, User
+
+MembershipModel = Union[Type[Favorite], Type[CartItem], Type[Follow]]
+
+
+class UserMemberships:
+    """
+    Ids of recipes in favorites and shopping cart of a user and ids
+    of authors followed by the user.
+
+    Ids are kept in sorted compact arrays in `USER_MEMBERSHIPS_CACHE`,
+    loaded with a single query on a miss, so serializers answer
+    `is_favorited`, `is_in_shopping_cart` and `is_subscribed` without
+    subqueries.
+
+    Ids are cached with the token of the version counter
+    `version(user_id)` read before they are loaded, and a different
+    current token is a miss, so ids loaded concurrently with a change
+    are never served after it. When a favorite, cart item or follow is
+    created or deleted, signals update the cached arrays in place once
+    the transaction commits and tag them with the new token of the
+    counter, under a lock in the cache shared by workers. If the lock is
+    not acquired in time, only the counter is bumped and the ids are
+    loaded again on the next request.
+    """
+    FAVORITES: str = 'favorites'
+    CART: str = 'cart'
+    FOLLOWS: str = 'follows'
+    KINDS: Dict[MembershipModel, str] = {
+        Favorite: FAVORITES,
+        CartItem: CART,
+        Follow: FOLLOWS,
+    }
+    LOCK_TIMEOUT: int = 5
+    LOCK_WAIT: float = 0.5
+
+    def __init__(self, ids: Dict[str, array]) -> None:
+        self.ids: Dict[str, array] = ids
+
+    def is_favorited(self, recipe_id: int) -> bool:
+        return self._contains(self.FAVORITES, recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id: int) -> bool:
+        return self._contains(self.CART, recipe_id)
+
+    def is_subscribed(self, user_id: int) -> bool:
+        return self._contains(self.FOLLOWS, user_id)
+
+    def _contains(self, kind: str, object_id: int) -> bool:
+        ids = self.ids[kind]
+        position = bisect_left(ids, object_id)
+        return position < len(ids) and ids[position] == object_id
+
+    @classmethod
+    def get(cls, user: User) -> Optional['UserMemberships']:
+        """Returns memberships of `user` or None for anonymous users."""
+        if not user.is_authenticated:
+            return None
+        token = get_versions([cls.version(user.pk)])[0]
+        cached = cls._get_cache().get(cls._get_key(user.pk))
+        if cached is not None and cached[0] == token:
+            return cls(cached[1])
+        ids = cls._load(user.pk)
+        cls._get_cache().set(cls._get_key(user.pk), (token, ids),
+                             settings.USER_MEMBERSHIPS_CACHE_TIMEOUT)
+        return cls(ids)
+
+    @classmethod
+    def add(cls, model: MembershipModel, user_id: int,
+            object_ids: Iterable[int]) -> None:
+        """Adds `object_ids` to cached ids of the user on commit."""
+        cls._update_on_commit(cls.KINDS[model], user_id, object_ids, True)
+
+    @classmethod
+    def remove(cls, model: MembershipModel, user_id: int,
+               object_ids: Iterable[int]) -> None:
+        """Removes `object_ids` from cached ids of the user on commit."""
+        cls._update_on_commit(cls.KINDS[model], user_id, object_ids, False)
+
+    @classmethod
+    def _update_on_commit(cls, kind: str, user_id: int,
+                          object_ids: Iterable[int], is_member: bool) -> None:
+        object_ids = list(object_ids)
+
+        def update() -> None:
+            cache = cls._get_cache()
+            key = cls._get_key(user_id)
+            with cls._lock(user_id) as is_locked:
+                previous, token = replace_version(cls.version(user_id))
+                if not is_locked:
+                    return
+                cached = cache.get(key)
+                if cached is None or cached[0] != previous:
+                    return
+                ids = cached[1]
+                for object_id in object_ids:
+                    cls._update_ids(ids[kind], object_id, is_member)
+                cache.set(key, (token, ids),
+                          settings.USER_MEMBERSHIPS_CACHE_TIMEOUT)
+
+        if object_ids:
+            transaction.on_commit(update)
+
+    @classmethod
+    @contextmanager
+    def _lock(cls, user_id: int) -> Iterator[bool]:
+        """
+        Serializes updates of the ids of the user between workers and
+        yields whether the lock is held.
+        """
+        cache = cls._get_cache()
+        key = f'{cls._get_key(user_id)}:lock'
+        deadline = time.monotonic() + cls.LOCK_WAIT
+        while not cache.add(key, True, cls.LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                yield False
+                return
+            time.sleep(0.005)
+        try:
+            yield True
+        finally:
+            cache.delete(key)
+
+    @staticmethod
+    def _update_ids(ids: array, object_id: int, is_member: bool) -> None:
+        position = bisect_left(ids, object_id)
+        exists = position < len(ids) and ids[position] == object_id
+        if is_member and not exists:
+            insort(ids, object_id)
+        elif not is_member and exists:
+            del ids[position]
+
+    @classmethod
+    def _load(cls, user_id: int) -> Dict[str, array]:
+        rows = cls._values(Favorite, 'recipe_id', owner=user_id).union(
+            cls._values(CartItem, 'recipe_id', owner=user_id),
+            cls._values(Follow, 'following_id', user=user_id),
+            all=True,
+        )
+        kinds = list(cls.KINDS.values())
+        values: Dict[str, list] = {kind: [] for kind in kinds}
+        for kind, object_id in rows:
+            values[kinds[kind]].append(object_id)
+        return {kind: array('I', sorted(ids)) for kind, ids in values.items()}
+
+    @classmethod
+    def _values(cls, model: Type[Model], field: str, **filters) -> Iterable:
+        kind = list(cls.KINDS).index(model)
+        return model.objects.filter(**filters).values_list(
+            Value(kind, output_field=IntegerField()), field,
+        ).order_by()
+
+    @staticmethod
+    def version(user_id: int) -> str:
+        """Name of the version counter of memberships, see `core.cache`."""
+        return f'user-memberships:{user_id}'
+
+    @staticmethod
+    def _get_cache():
+        return caches[settings.USER_MEMBERSHIPS_CACHE]
+
+    @staticmethod
+    def _get_key(user_id: int) -> str:
+        return f'user-memberships:{user_id}'
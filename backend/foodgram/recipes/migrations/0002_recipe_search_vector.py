@@ -0,0 +1,75 @@
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# The search vector is maintained by a trigger, so rows written through
+# `bulk_create`, `update()` or raw SQL are indexed as well. The config
+# must match `recipes.search.RECIPE_SEARCH_CONFIG`.
+CREATE_SEARCH_SQL = (
+    """
+    CREATE FUNCTION recipes_recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update();
+    """,
+    'UPDATE recipes_recipe SET name = name;',
+    """
+    CREATE INDEX recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector);
+    """,
+    """
+    CREATE INDEX recipes_recipe_name_trgm_gin
+    ON recipes_recipe USING gin ((UPPER(name::text)) gin_trgm_ops);
+    """,
+    """
+    CREATE INDEX recipes_recipe_text_trgm_gin
+    ON recipes_recipe USING gin ((UPPER(text::text)) gin_trgm_ops);
+    """,
+)
+
+DROP_SEARCH_SQL = (
+    'DROP INDEX IF EXISTS recipes_recipe_text_trgm_gin;',
+    'DROP INDEX IF EXISTS recipes_recipe_name_trgm_gin;',
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe;',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SEARCH_SQL),
+            run_on_postgresql(DROP_SEARCH_SQL),
+        ),
+    ]
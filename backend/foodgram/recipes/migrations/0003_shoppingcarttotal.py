@@ -0,0 +1,61 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    CartItem = apps.get_model('recipes', 'CartItem')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    rows = CartItem.objects.filter(
+        recipe__recipe_ingredient__isnull=False
+    ).values(
+        'owner', 'recipe__recipe_ingredient__ingredient'
+    ).annotate(
+        total_amount=Sum('recipe__recipe_ingredient__amount')
+    ).order_by()
+    ShoppingCartTotal.objects.bulk_create(
+        (
+            ShoppingCartTotal(
+                owner_id=row['owner'],
+                ingredient_id=row['recipe__recipe_ingredient__ingredient'],
+                amount=row['total_amount'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Общее количество единиц')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Владелец списка покупок')),
+            ],
+            options={
+                'verbose_name': 'shopping cart total',
+                'verbose_name_plural': 'shopping cart totals',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('owner', 'ingredient'), name='unique_shopping_cart_total'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_totals,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.18 on 2026-10-18 06:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия рецепта')),
+                ('built_version', models.PositiveIntegerField(null=True, verbose_name='Версия рецепта в документе')),
+                ('body', models.TextField(blank=True, verbose_name='JSON рецепта')),
+            ],
+            options={
+                'verbose_name': 'recipe document',
+                'verbose_name_plural': 'recipe documents',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.18 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipedocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, verbose_name='Список')),
+                ('digest', models.CharField(max_length=64, verbose_name='SHA-256 JSON')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('body', models.BinaryField(verbose_name='JSON')),
+                ('gzip_body', models.BinaryField(verbose_name='JSON в gzip')),
+                ('brotli_body', models.BinaryField(null=True, verbose_name='JSON в brotli')),
+            ],
+            options={
+                'verbose_name': 'catalog snapshot',
+                'verbose_name_plural': 'catalog snapshots',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='catalogsnapshot',
+            constraint=models.UniqueConstraint(fields=('name', 'digest'), name='unique_catalog_snapshot'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
+from core.counters import CounterFieldsMixin
+
 User = get_user_model()
 
 
@@ -53,7 +56,7 @@ class Ingredient(models.Model):
         return f'{self.name} {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         models.CASCADE,
@@ -93,11 +96,30 @@ class Recipe(models.Model):
         'Дата и время создания рецепта',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        'Число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    COUNTER_FIELDS = ('favorites_count',)
 
     class Meta:
         ordering = ('-created_at',)
         verbose_name = 'recipe'
         verbose_name_plural = 'recipes'
+        indexes = (
+            # Keyset pagination of the recipes list.
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='recipe_created_at_id_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return self.name
@@ -202,3 +224,92 @@ class Favorite(models.Model):
     def __str__(self) -> str:
         return (f'{self.__class__.__name__}: owner={self.owner} '
                 f'| recipe={self.recipe}')
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Total amount of an ingredient over all recipes in the shopping cart
+    of the owner. Maintained by `recipes.services.ShoppingCartTotals`.
+    """
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Владелец списка покупок',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField('Общее количество единиц')
+
+    class Meta:
+        verbose_name = 'shopping cart total'
+        verbose_name_plural = 'shopping cart totals'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('owner', 'ingredient'),
+                name='unique_shopping_cart_total',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return (f'{self.__class__.__name__}: owner={self.owner} '
+                f'| ingredient={self.ingredient} | amount={self.amount}')
+
+
+class RecipeDocument(models.Model):
+    """
+    Pre-rendered JSON of a recipe. Maintained by
+    `recipes.documents.RecipeDocuments`.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт',
+    )
+    version = models.PositiveIntegerField('Версия рецепта', default=0)
+    built_version = models.PositiveIntegerField(
+        'Версия рецепта в документе',
+        null=True,
+    )
+    body = models.TextField('JSON рецепта', blank=True)
+
+    class Meta:
+        verbose_name = 'recipe document'
+        verbose_name_plural = 'recipe documents'
+
+    def __str__(self) -> str:
+        return (f'{self.__class__.__name__}: recipe={self.recipe_id} '
+                f'| version={self.version}')
+
+
+class CatalogSnapshot(models.Model):
+    """
+    Immutable JSON of the list of tags or ingredients, compressed
+    in advance. Maintained by `recipes.catalog.CatalogSnapshots`.
+    """
+    name = models.CharField('Список', max_length=32)
+    digest = models.CharField('SHA-256 JSON', max_length=64)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    body = models.BinaryField('JSON')
+    gzip_body = models.BinaryField('JSON в gzip')
+    brotli_body = models.BinaryField('JSON в brotli', null=True)
+
+    class Meta:
+        verbose_name = 'catalog snapshot'
+        verbose_name_plural = 'catalog snapshots'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'digest'),
+                name='unique_catalog_snapshot',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return (f'{self.__class__.__name__}: name={self.name} '
+                f'| digest={self.digest}')
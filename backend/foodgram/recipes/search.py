@@ -0,0 +1,246 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank, TrigramSimilarity)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import Combinable
+from django.db.models.functions import (Concat, Greatest, Lower, Replace,
+                                        StrIndex, Substr)
+from django.db.models.query import QuerySet
+
+from recipes.models import Ingredient
+from recipes.serializers.common import IngredientSerializer
+
+# Must match the trigger in `recipes/migrations/0002_recipe_search_vector.py`.
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SNIPPET_LENGTH = 300
+# Characters kept before the highlighted match on backends without
+# `ts_headline`.
+RECIPE_SNIPPET_CONTEXT = 100
+# `django.utils.html.escape`, `&` goes first.
+HTML_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'),
+                ('"', '&quot;'), ("'", '&#x27;'))
+
+
+class IngredientSearchIndex:
+    """
+    In-process search index over the `Ingredient` table.
+
+    Documents are kept in compact arrays sorted by the lowercased name,
+    so prefix matches are a contiguous slice found by bisection and
+    substring matches come from an n-gram posting map. Both return
+    positions in name order, which reproduces the ordering of
+    `IngredientFilter.filter_istartswith_and_icontains`.
+
+    The index is built lazily once per worker, updated through
+    `Ingredient` signals and rebuilt after `max_age` seconds to pick up
+    writes made by other workers.
+    """
+    NGRAM_SIZE: int = 3
+
+    def __init__(self, max_age: Optional[int] = None) -> None:
+        self.max_age: Optional[int] = max_age
+        self._lock = threading.Lock()
+        self._built_at: Optional[float] = None
+        self._documents_by_id: Dict[int, dict] = {}
+        self._state: Tuple[List[str], List[dict], Dict[str, array]] = (
+            [], [], {}
+        )
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    def search(self, value: str) -> List[dict]:
+        """Returns serialized ingredients matching `value`."""
+        self._ensure_built()
+        query = value.lower()
+        keys, documents, postings = self._state
+        start = bisect_left(keys, query)
+        stop = start
+        while stop < len(keys) and keys[stop].startswith(query):
+            stop += 1
+        result = documents[start:stop]
+        result.extend(
+            documents[position]
+            for position in self._candidates(query, postings)
+            if not start <= position < stop and query in keys[position]
+        )
+        return result
+
+    def build(self) -> None:
+        documents = IngredientSerializer(
+            Ingredient.objects.all(), many=True
+        ).data
+        with self._lock:
+            self._documents_by_id = {
+                document['id']: dict(document) for document in documents
+            }
+            self._rebuild()
+
+    def update(self, ingredient: Ingredient) -> None:
+        if not self.is_built:
+            return
+        with self._lock:
+            self._documents_by_id[ingredient.pk] = dict(
+                IngredientSerializer(ingredient).data
+            )
+            self._rebuild()
+
+    def remove(self, ingredient_id: int) -> None:
+        if not self.is_built:
+            return
+        with self._lock:
+            if self._documents_by_id.pop(ingredient_id, None) is not None:
+                self._rebuild()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._built_at = None
+            self._documents_by_id = {}
+            self._state = ([], [], {})
+
+    def _ensure_built(self) -> None:
+        if (self._built_at is None
+                or (self.max_age is not None
+                    and time.monotonic() - self._built_at > self.max_age)):
+            self.build()
+
+    def _rebuild(self) -> None:
+        """Recomputes the sorted arrays. Must be called under the lock."""
+        documents = sorted(
+            self._documents_by_id.values(),
+            key=lambda document: (document['name'].lower(), document['id']),
+        )
+        keys = [document['name'].lower() for document in documents]
+        postings: Dict[str, array] = {}
+        for position, key in enumerate(keys):
+            for gram in self._ngrams(key):
+                postings.setdefault(gram, array('I')).append(position)
+        self._state = (keys, documents, postings)
+        self._built_at = time.monotonic()
+
+    def _ngrams(self, key: str) -> set:
+        """Returns every distinct gram of `key` up to `NGRAM_SIZE` long."""
+        return {
+            key[i:i + size]
+            for size in range(1, self.NGRAM_SIZE + 1)
+            for i in range(len(key) - size + 1)
+        }
+
+    def _candidates(self, query: str,
+                    postings: Dict[str, array]) -> List[int]:
+        """
+        Returns sorted positions whose keys contain every gram of `query`.
+        Candidates still have to be checked for the whole substring.
+        """
+        size = min(len(query), self.NGRAM_SIZE)
+        grams = {query[i:i + size] for i in range(len(query) - size + 1)}
+        query_postings = sorted(
+            (postings.get(gram, array('I')) for gram in grams),
+            key=len,
+        )
+        if not query_postings or not query_postings[0]:
+            return []
+        if len(query_postings) == 1:
+            return list(query_postings[0])
+        candidates = set(query_postings[0])
+        for posting in query_postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+
+ingredient_search_index = IngredientSearchIndex(
+    max_age=settings.INGREDIENT_SEARCH_INDEX_MAX_AGE,
+)
+
+
+def search_recipes(queryset: QuerySet, value: str,
+                   highlight: bool = False) -> QuerySet:
+    """
+    Filters recipes by `value` in name or text, ordered by relevance.
+
+    PostgreSQL matches the stored `search_vector` plus substrings backed by
+    the trigram indexes and ranks with `ts_rank` and name similarity.
+    Other backends fall back to `icontains` with a coarse rank so the
+    parameter can be used locally. `search_snippet` is annotated
+    when `highlight` is true.
+    """
+    substring_match = Q(name__icontains=value) | Q(text__icontains=value)
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(value, config=RECIPE_SEARCH_CONFIG)
+        queryset = queryset.filter(
+            Q(search_vector=search_query) | substring_match
+        ).annotate(
+            search_rank=(
+                SearchRank(F('search_vector'), search_query)
+                + TrigramSimilarity('name', value)
+            ),
+        )
+        if highlight:
+            queryset = queryset.annotate(search_snippet=SearchHeadline(
+                escape_html(F('text')), search_query,
+                config=RECIPE_SEARCH_CONFIG, max_fragments=1,
+                start_sel='<b>', stop_sel='</b>',
+            ))
+    else:
+        queryset = queryset.filter(substring_match).annotate(
+            search_rank=Case(
+                When(name__istartswith=value, then=Value(3.0)),
+                When(name__icontains=value, then=Value(2.0)),
+                default=Value(1.0),
+                output_field=FloatField(),
+            ),
+        )
+        if highlight:
+            queryset = highlight_first_match(queryset, 'text', value)
+    return queryset.order_by('-search_rank', '-created_at')
+
+
+def escape_html(expression: Combinable) -> Combinable:
+    """`django.utils.html.escape` of a text expression in SQL."""
+    for character, entity in HTML_ESCAPES:
+        expression = Replace(expression, Value(character), Value(entity))
+    return expression
+
+
+def highlight_first_match(queryset: QuerySet, field: str,
+                          value: str) -> QuerySet:
+    """
+    Annotates `search_snippet`, the escaped fragment of `field` around
+    the first case-insensitive match of `value` wrapped in `<b>`, for
+    backends without `ts_headline`. Matches follow `icontains` of the
+    backend: SQLite folds ASCII only. The text is cut before it is
+    escaped, so cuts never split an entity or a tag, and `value` is never
+    inserted into the markup.
+    """
+    length = len(value)
+    queryset = queryset.alias(
+        search_match=StrIndex(Lower(field), Lower(Value(value))),
+    )
+    position = F('search_match')
+    start = Greatest(position - RECIPE_SNIPPET_CONTEXT, Value(1))
+    match_end = position + length
+    return queryset.annotate(search_snippet=Case(
+        When(search_match__gt=0, then=Concat(
+            escape_html(Substr(field, start, position - start)),
+            Value('<b>'),
+            escape_html(Substr(field, position, length)),
+            Value('</b>'),
+            escape_html(Substr(
+                field, match_end,
+                Greatest(RECIPE_SNIPPET_LENGTH - (match_end - start),
+                         Value(0)),
+            )),
+        )),
+        # The match is in the name only.
+        default=escape_html(Substr(field, 1, RECIPE_SNIPPET_LENGTH)),
+    ))
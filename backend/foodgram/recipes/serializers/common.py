@@ -1,9 +1,21 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Manager, Prefetch
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
-from users.serializers import UserSerializer
+from core.relations import BulkListSerializer, BulkPrimaryKeyRelatedField
+from core.serialization import get_field_plan, get_file_url, render_json_list
+from recipes.documents import RecipeDocuments
+from recipes.memberships import UserMemberships
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartTotal, Tag)
+from recipes.services import ShoppingCartTotals
+from users.serializers import UserListSerializer, UserSerializer
 
 User = get_user_model()
 
@@ -33,20 +45,33 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
 
 
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.pk')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+        model = ShoppingCartTotal
+
+
 class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(source='ingredient.pk',
-                                            queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(source='ingredient.pk',
+                                    queryset=Ingredient.objects.all())
 
     class Meta:
         fields = ('id', 'amount')
         model = RecipeIngredient
+        list_serializer_class = BulkListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """
     Serializer for Recipe model.
-    Be sure to annotate `is_favorited`, `is_in_shopping_cart`
-    and `author.is_subscribed` when many=True for optimized queries.
+    Be sure to pass `UserMemberships` of the user as `memberships`
+    in the context when many=True for optimized queries.
+    `search_snippet` is rendered only when annotated by the search filter.
     """
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
@@ -58,12 +83,15 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
                   'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time')
+                  'text', 'cooking_time', 'favorites_count')
         model = Recipe
 
     def get_is_favorited(self, obj):
         if hasattr(obj, 'is_favorited'):
             return obj.is_favorited
+        memberships = self.context.get('memberships')
+        if memberships is not None:
+            return memberships.is_favorited(obj.pk)
         user = self.context['request'].user
         return (user.is_authenticated
                 and obj.favorites.filter(owner=user).exists())
@@ -71,14 +99,186 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_is_in_shopping_cart(self, obj):
         if hasattr(obj, 'is_in_shopping_cart'):
             return obj.is_in_shopping_cart
+        memberships = self.context.get('memberships')
+        if memberships is not None:
+            return memberships.is_in_shopping_cart(obj.pk)
         user = self.context['request'].user
         return (user.is_authenticated
                 and obj.cartitems.filter(owner=user).exists())
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if hasattr(instance, 'search_snippet'):
+            representation['search_snippet'] = instance.search_snippet
+        return representation
+
+
+class RecipeDocumentAuthorSerializer(UserSerializer):
+
+    def get_is_subscribed(self, obj):
+        return None
+
+
+class RecipeDocumentBuildSerializer(RecipeSerializer):
+    """
+    `RecipeSerializer` output stored in `RecipeDocument`, values
+    rendered per request by `RecipeDocuments.render` are None.
+    """
+    author = RecipeDocumentAuthorSerializer(read_only=True)
+    favorites_count = serializers.SerializerMethodField()
+
+    def get_is_favorited(self, obj):
+        return None
+
+    def get_is_in_shopping_cart(self, obj):
+        return None
+
+    def get_favorites_count(self, obj):
+        return None
+
+
+class RecipeDocumentListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.render_many(list(recipes))
+
+
+class RecipeDocumentSerializer(serializers.BaseSerializer):
+    """
+    Read-only `RecipeSerializer` output made of `RecipeDocument`s.
+    Load recipes with `select_related('document')` and pass
+    `UserMemberships` of the user as `memberships` in the context.
+    `favorites_count` is left `null` when the context has a false
+    `favorites_count`, see `RecipeDocuments.render_favorites_counts`.
+    """
+
+    class Meta:
+        list_serializer_class = RecipeDocumentListSerializer
+
+    def to_representation(self, instance):
+        return self.render_many([instance])[0]
+
+    def render_many(self, recipes):
+        bodies = RecipeDocuments.get_bodies(recipes)
+        missing = [recipe.pk for recipe in recipes if recipe.pk not in bodies]
+        if missing:
+            bodies.update(RecipeDocuments.build(
+                missing, RecipeDocumentRenderer.render_many
+            ))
+        request = self.context.get('request')
+        if 'memberships' in self.context:
+            memberships = self.context['memberships']
+        else:
+            memberships = UserMemberships.get(request.user)
+        favorites_count = self.context.get('favorites_count', True)
+        # Recipes deleted after the page was read have no documents.
+        return [
+            RecipeDocuments.render(bodies[recipe.pk], recipe, memberships,
+                                   request, favorites_count)
+            for recipe in recipes if recipe.pk in bodies
+        ]
+
+
+class RecipeDocumentRenderer:
+    """
+    Renders `RecipeDocumentBuildSerializer` output from `values()` rows
+    with `FieldPlan`s of the serializers instead of model instances and
+    serializer fields. Authors, tags and ingredients are rendered once
+    per call and shared by their recipes. Tags and ingredients of
+    a recipe are ordered by primary key, load recipes for the serializer
+    with `get_prefetches` to get the same order. The output is compared
+    with the serializer by the `check_fast_serializers` command.
+    """
+    RECIPE_PLAN = get_field_plan(RecipeSerializer.Meta.fields)
+    AUTHOR_PLAN = get_field_plan(UserSerializer.Meta.fields)
+    TAG_PLAN = get_field_plan(TagSerializer.Meta.fields)
+    INGREDIENT_PLAN = get_field_plan(
+        IngredientInRecipeSerializer.Meta.fields
+    )
+
+    @classmethod
+    def render_many(cls, recipe_ids: List[int]) -> Dict[int, str]:
+        recipes = list(Recipe.objects.filter(pk__in=recipe_ids).values(
+            'id', 'author_id', 'name', 'image', 'text', 'cooking_time',
+        ))
+        if not recipes:
+            return {}
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        authors = {
+            author['id']: cls.AUTHOR_PLAN.render(
+                dict(author, is_subscribed=None)
+            )
+            for author in User.objects.filter(
+                pk__in={recipe['author_id'] for recipe in recipes}
+            ).values(*UserListSerializer.VALUES)
+        }
+        # Ordered as in `get_prefetches`.
+        tags = defaultdict(list)
+        rendered_tags = {}
+        for tag in Tag.objects.filter(recipes__in=recipe_ids).values(
+            *TagSerializer.Meta.fields, recipe_id=F('recipes'),
+        ).order_by('pk'):
+            if tag['id'] not in rendered_tags:
+                rendered_tags[tag['id']] = cls.TAG_PLAN.render(tag)
+            tags[tag['recipe_id']].append(rendered_tags[tag['id']])
+        recipe_ingredients = list(RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids
+        ).values('recipe_id', 'ingredient_id', 'amount').order_by('pk'))
+        ingredients = {
+            ingredient['id']: ingredient
+            for ingredient in Ingredient.objects.filter(pk__in={
+                row['ingredient_id'] for row in recipe_ingredients
+            }).values('id', 'name', 'measurement_unit')
+        }
+        ingredients_by_recipe = defaultdict(list)
+        for row in recipe_ingredients:
+            ingredients_by_recipe[row['recipe_id']].append(
+                cls.INGREDIENT_PLAN.render(dict(
+                    ingredients[row['ingredient_id']], amount=row['amount']
+                ))
+            )
+        storage = Recipe._meta.get_field('image').storage
+        return {
+            recipe['id']: cls.RECIPE_PLAN.render(dict(
+                recipe,
+                tags=render_json_list(tags[recipe['id']]),
+                author=authors[recipe['author_id']],
+                ingredients=render_json_list(
+                    ingredients_by_recipe[recipe['id']]
+                ),
+                is_favorited=None,
+                is_in_shopping_cart=None,
+                image=get_file_url(storage, recipe['image']),
+                favorites_count=None,
+            ))
+            for recipe in recipes
+        }
+
+    @staticmethod
+    def get_prefetches() -> Tuple[Prefetch, Prefetch]:
+        """Prefetches of `RecipeSerializer` in the order of `render_many`."""
+        return (
+            Prefetch('tags', queryset=Tag.objects.order_by('pk')),
+            Prefetch('recipe_ingredient',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient'
+                     ).order_by('pk')),
+        )
+
+    @staticmethod
+    def render_with_serializer(recipe: Recipe) -> str:
+        """
+        Reference output for recipes loaded with `get_prefetches` and
+        `select_related('author')`.
+        """
+        return JSONRenderer().render(
+            RecipeDocumentBuildSerializer(recipe).data
+        ).decode()
+
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = BulkPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
     ingredients = IngredientInRecipeCreateSerializer(many=True)
     image = Base64ImageField()
 
@@ -97,6 +297,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         return ingredients
 
+    @transaction.atomic
+    @RecipeDocuments.batch_invalidation()
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -105,13 +307,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self._set_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
+    @RecipeDocuments.batch_invalidation()
     def update(self, instance, validated_data):
         if 'tags' in validated_data:
             instance.tags.set(validated_data.pop('tags'))
         if 'ingredients' in validated_data:
+            old_amounts = ShoppingCartTotals.get_amounts(instance)
             RecipeIngredient.objects.filter(recipe=instance).delete()
             ingredients_data = validated_data.pop('ingredients')
             self._set_ingredients(ingredients_data, instance)
+            ShoppingCartTotals.change_recipe_amounts(
+                instance, old_amounts, {
+                    ingredient['ingredient']['pk'].pk: ingredient['amount']
+                    for ingredient in ingredients_data
+                }
+            )
         return super().update(instance, validated_data)
 
     def _set_ingredients(self, ingredients, recipe):
@@ -126,4 +337,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @property
     def data(self):
-        return RecipeSerializer(self.instance, context=self.context).data
+        if self.instance is None:
+            return super().data
+        return RecipeDocumentSerializer(self.instance,
+                                        context=self.context).data
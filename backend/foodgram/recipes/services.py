@@ -1,19 +1,47 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
 from io import BytesIO
-from typing import Optional, Union
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Type, Union
 
 import pdfkit
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import (Case, Exists, F, IntegerField, Model, OuterRef,
+                              Sum, Value, When)
+from django.db.models.functions import Greatest
 from django.db.models.query import QuerySet
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.module_loading import import_string
+from fontTools import subset
+from fontTools.ttLib import TTFont
+from fpdf import FPDF
 from rest_framework import status
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from recipes.models import CartItem, Favorite, Recipe, RecipeIngredient
+from core.bulk import BulkCreateDelete
+from core.cache import bump_versions
+from core.counters import (decrement_counter, increment_counter,
+                           reconcile_counter)
+from core.toggles import (bulk_delete_returning, bulk_insert_ignore_returning,
+                          delete_returning, insert_ignore_returning)
+from recipes.documents import RecipeDocuments
+from recipes.memberships import UserMemberships
+from recipes.models import (CartItem, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCartTotal, Tag)
 from recipes.serializers.nested import RecipeShorthandSerializer
+from users.models import Follow
 
 User = get_user_model()
 
@@ -38,54 +66,667 @@ class FavoriteCartCreateDelete:
 
     def create(self) -> Response:
         recipe = self._get_recipe_or_404()
-        if self._is_model_exists(recipe):
+        with transaction.atomic():
+            obj = self._perform_create(recipe)
+        if obj is None:
             return Response(
                 {self.ERRORS_KEY: self.already_exists_error_message},
                 status.HTTP_400_BAD_REQUEST
             )
-        obj = self.model_class.objects.create(owner=self.user,
-                                              recipe=recipe)
-        serializer = RecipeShorthandSerializer(obj.recipe)
+        serializer = RecipeShorthandSerializer(recipe)
         return Response(serializer.data, status.HTTP_201_CREATED)
 
     def delete(self) -> Response:
-        recipe = self._get_recipe_or_404()
-        if not self._is_model_exists(recipe):
+        with transaction.atomic():
+            is_deleted = self._perform_delete(self.recipe_id)
+        if not is_deleted:
+            self._get_recipe_or_404()
             return Response(
                 {self.ERRORS_KEY: self.model_not_exists_error_message},
                 status.HTTP_400_BAD_REQUEST
             )
-        self.model_class.objects.get(owner=self.user, recipe=recipe).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def _is_model_exists(self, recipe: Recipe) -> bool:
-        return self.model_class.objects.filter(
-            owner=self.user, recipe=recipe
-        ).exists()
+    def _perform_create(self,
+                        recipe: Recipe) -> Optional[Union[Favorite, CartItem]]:
+        """Returns None if the recipe is already added."""
+        return insert_ignore_returning(self.model_class,
+                                       owner_id=self.user.pk,
+                                       recipe_id=recipe.pk)
+
+    def _perform_delete(self, recipe_id: int) -> bool:
+        """Returns False if the recipe is not added."""
+        return delete_returning(self.model_class, owner_id=self.user.pk,
+                                recipe_id=recipe_id) is not None
 
     def _get_recipe_or_404(self) -> Recipe:
         return get_object_or_404(
-            self.recipe_queryset,
+            self.recipe_queryset.only(*RecipeShorthandSerializer.Meta.fields),
             id=self.recipe_id,
         )
 
 
+SHOPPING_CART_TITLE = 'Список покупок'
+SHOPPING_CART_EMPTY = 'Список пуст'
+SHOPPING_CART_LOGO = (
+    Path(__file__).resolve().parent / 'static' / 'recipes'
+    / 'shopping_cart_logo.png'
+)
+
+
+@lru_cache(maxsize=None)
+def get_shopping_cart_logo() -> bytes:
+    return SHOPPING_CART_LOGO.read_bytes()
+
+
+class RecipeCacheVersions:
+    """
+    Version counters of cached recipe responses, see `core.cache`.
+    `CATALOG` covers tags, ingredients and authors shown in every recipe,
+    `RECIPES` covers the list and `recipe(id)` a single recipe.
+    `TAGS` and `INGREDIENTS` cover their own lists and are bumped with
+    `CATALOG`.
+
+    Favorites change `favorites_count` far more often than recipes
+    change, so they bump `recipe(id)` and `FAVORITES_COUNTS`, which only
+    tags of lists depend on. Cached list data leaves the counts out and
+    gets them per request, see `RecipeViewSet.render_cached_data`.
+    """
+    CATALOG: str = 'catalog'
+    RECIPES: str = 'recipes'
+    TAGS: str = 'tags'
+    INGREDIENTS: str = 'ingredients'
+    FAVORITES_COUNTS: str = 'favorites-counts'
+
+    @staticmethod
+    def recipe(recipe_id: int) -> str:
+        return f'recipe:{recipe_id}'
+
+    @classmethod
+    def bump_recipe(cls, recipe_id: int) -> None:
+        bump_versions(cls.RECIPES, cls.recipe(recipe_id))
+
+    @classmethod
+    def bump_recipes(cls, recipe_ids: Iterable[int]) -> None:
+        bump_versions(cls.RECIPES, *map(cls.recipe, recipe_ids))
+
+    @classmethod
+    def bump_favorites_counts(cls, recipe_ids: Iterable[int]) -> None:
+        bump_versions(cls.FAVORITES_COUNTS, *map(cls.recipe, recipe_ids))
+
+    @classmethod
+    def bump_catalog(cls, *names: str) -> None:
+        """Bumps `CATALOG` and `names` of the changed lists."""
+        bump_versions(cls.CATALOG, *names)
+
+
+class DenormalizedCounters:
+    """
+    Counters kept current by signals in the transactions that create or
+    delete `Favorite`, `Recipe` and `Follow` rows.
+    `reconcile` repairs drift after bulk writes that skip signals.
+    """
+
+    @staticmethod
+    def reconcile() -> Dict[str, int]:
+        """Returns the number of fixed rows for every counter."""
+        with transaction.atomic():
+            return {
+                'favorites_count': reconcile_counter(
+                    Recipe.objects.all(), 'favorites_count',
+                    Favorite.objects.all(), 'recipe',
+                ),
+                'recipes_count': reconcile_counter(
+                    User.objects.all(), 'recipes_count',
+                    Recipe.objects.all(), 'author',
+                ),
+                'followers_count': reconcile_counter(
+                    User.objects.all(), 'followers_count',
+                    Follow.objects.all(), 'following',
+                ),
+            }
+
+
+# Basic Latin, Latin-1, Latin Extended-A, Cyrillic, general punctuation, №.
+PDF_FONT_UNICODES = (
+    *range(0x20, 0x17f), *range(0x400, 0x500), *range(0x2000, 0x2070), 0x2116,
+)
+PDF_FONT_CHARACTERS = frozenset(map(chr, PDF_FONT_UNICODES))
+
+
+def get_pdf_font(path: str, text: str) -> str:
+    """
+    Returns the path to the TrueType font reduced to `PDF_FONT_UNICODES`
+    or to the whole font if `text` has other characters, e.g. ⅓ or CJK,
+    whose glyphs the reduced font lacks.
+    """
+    if PDF_FONT_CHARACTERS.issuperset(text):
+        return get_pdf_font_subset(path)
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font_subset(path: str) -> str:
+    """
+    Returns the path to a copy of the TrueType font reduced to
+    `PDF_FONT_UNICODES`, so each document parses and subsets a few hundred
+    glyphs instead of the whole font. The copy is shared by workers
+    through the temporary directory.
+    """
+    source = Path(path)
+    key = hashlib.sha1(
+        f'{source.resolve()}:{source.stat().st_mtime_ns}'.encode()
+    ).hexdigest()[:16]
+    target = Path(tempfile.gettempdir(), f'foodgram-{key}-{source.name}')
+    if not target.exists():
+        options = subset.Options()
+        options.layout_features = []
+        options.hinting = False
+        options.notdef_outline = True
+        options.drop_tables.append('FFTM')
+        font = TTFont(source)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=PDF_FONT_UNICODES)
+        subsetter.subset(font)
+        temporary = target.with_name(f'{target.name}.{os.getpid()}')
+        font.save(temporary)
+        os.replace(temporary, target)
+    return str(target)
+
+
+class ShoppingCartRenderer:
+    """
+    Base class for shopping list PDF renderers.
+
+    Subclasses implement `render`, which receives the aggregated
+    `ingredient__name`, `ingredient__measurement_unit`, `total_amount`
+    rows and returns the PDF document.
+    """
+
+    def render(self, unique_ingredients: list) -> bytes:
+        raise NotImplementedError
+
+    @staticmethod
+    def format_ingredient(ingredient: dict) -> str:
+        return (f'{ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]}): '
+                f'{ingredient["total_amount"]}')
+
+
+class PdfkitShoppingCartRenderer(ShoppingCartRenderer):
+    """Renders the HTML template through a wkhtmltopdf subprocess."""
+    TEMPLATE_NAME: str = 'recipes/shopping_cart.html'
+    PDFKIT_OPTIONS: dict = {
+        'page-size': 'Letter',
+        'encoding': "UTF-8",
+    }
+
+    def render(self, unique_ingredients: list) -> bytes:
+        template = get_template(self.TEMPLATE_NAME)
+        html = template.render({
+            'unique_ingredients': unique_ingredients,
+            'logo_base64': base64.b64encode(
+                get_shopping_cart_logo()
+            ).decode(),
+        })
+        return pdfkit.from_string(html, False, self.PDFKIT_OPTIONS)
+
+
+class FpdfShoppingCartRenderer(ShoppingCartRenderer):
+    """
+    Writes the PDF in process with fpdf2, mirroring the layout of
+    `recipes/shopping_cart.html`. The TrueType fonts from
+    `SHOPPING_CART_PDF_FONT` and `SHOPPING_CART_PDF_BOLD_FONT`
+    are embedded as subsets, which covers Cyrillic text.
+    """
+    FONT_FAMILY: str = 'ShoppingCart'
+    MARGIN: float = 28
+    HEADER_PADDING: float = 15
+    LOGO_SIZE: float = 72
+    TITLE_FONT_SIZE: float = 24
+    ITEM_FONT_SIZE: float = 18
+    ITEM_INDENT: float = 30
+    ITEM_LINE_HEIGHT: float = 24
+    HEADER_COLOR: int = 238
+
+    def render(self, unique_ingredients: list) -> bytes:
+        lines = [
+            self.format_ingredient(ingredient)
+            for ingredient in unique_ingredients
+        ] or [SHOPPING_CART_EMPTY]
+        pdf = FPDF(format='Letter', unit='pt')
+        pdf.set_margins(self.MARGIN, self.MARGIN)
+        pdf.set_auto_page_break(True, margin=self.MARGIN)
+        pdf.add_font(self.FONT_FAMILY, fname=get_pdf_font(
+            settings.SHOPPING_CART_PDF_FONT, ''.join(lines)
+        ))
+        pdf.add_font(self.FONT_FAMILY, style='B', fname=get_pdf_font(
+            settings.SHOPPING_CART_PDF_BOLD_FONT, SHOPPING_CART_TITLE
+        ))
+        pdf.add_page()
+        self._draw_header(pdf)
+        self._draw_lines(pdf, lines)
+        return bytes(pdf.output())
+
+    def _draw_header(self, pdf: FPDF) -> None:
+        header_height = self.LOGO_SIZE + 2 * self.HEADER_PADDING
+        pdf.set_fill_color(self.HEADER_COLOR)
+        pdf.rect(pdf.l_margin, pdf.t_margin, pdf.epw, header_height,
+                 style='F')
+        logo_x = pdf.l_margin + self.HEADER_PADDING
+        logo_y = pdf.t_margin + self.HEADER_PADDING
+        pdf.image(BytesIO(get_shopping_cart_logo()), x=logo_x, y=logo_y,
+                  w=self.LOGO_SIZE, h=self.LOGO_SIZE)
+        pdf.set_font(self.FONT_FAMILY, style='B', size=self.TITLE_FONT_SIZE)
+        pdf.set_xy(logo_x + self.LOGO_SIZE + self.HEADER_PADDING / 2, logo_y)
+        pdf.cell(h=self.LOGO_SIZE, txt=SHOPPING_CART_TITLE)
+        pdf.set_y(pdf.t_margin + header_height + self.ITEM_FONT_SIZE)
+
+    def _draw_lines(self, pdf: FPDF, lines: List[str]) -> None:
+        pdf.set_font(self.FONT_FAMILY, size=self.ITEM_FONT_SIZE)
+        for line in lines:
+            pdf.set_x(pdf.l_margin + self.ITEM_INDENT)
+            pdf.multi_cell(w=0, h=self.ITEM_LINE_HEIGHT, txt=f'\u2022 {line}',
+                           new_x='LMARGIN', new_y='NEXT')
+
+
+def get_shopping_cart_renderer(
+        path: Optional[str] = None) -> ShoppingCartRenderer:
+    """Returns the renderer from `SHOPPING_CART_PDF_RENDERER` by default."""
+    return import_string(path or settings.SHOPPING_CART_PDF_RENDERER)()
+
+
+class CartItemCreateDelete(FavoriteCartCreateDelete):
+    """Keeps `ShoppingCartTotal` in the transaction of the cart change."""
+
+    def __init__(self, request: Request, recipe_queryset: QuerySet,
+                 recipe_id: Optional[int],
+                 already_exists_error_message: str,
+                 model_not_exists_error_message: str) -> None:
+        super().__init__(request, recipe_queryset, recipe_id, CartItem,
+                         already_exists_error_message,
+                         model_not_exists_error_message)
+
+    def _perform_create(self, recipe: Recipe) -> Optional[CartItem]:
+        cart_item = super()._perform_create(recipe)
+        if cart_item is not None:
+            ShoppingCartTotals.add_recipe(self.user, recipe)
+        return cart_item
+
+    def _perform_delete(self, recipe_id: int) -> bool:
+        is_deleted = super()._perform_delete(recipe_id)
+        if is_deleted:
+            ShoppingCartTotals.remove_recipes(self.user, (recipe_id,))
+        return is_deleted
+
+
+class FavoriteCartBulkCreateDelete(BulkCreateDelete):
+    NOT_FOUND_ERROR_MESSAGE: str = 'Рецепт не найден!'
+
+    def __init__(self, request: Request,
+                 model_class: Union[Favorite, CartItem],
+                 already_exists_error_message: str,
+                 model_not_exists_error_message: str) -> None:
+        super().__init__(request, already_exists_error_message,
+                         model_not_exists_error_message)
+        self.model_class: Union[Favorite, CartItem] = model_class
+
+    def get_links(self, ids: List[int]) -> Dict[int, bool]:
+        return dict(Recipe.objects.filter(pk__in=ids).annotate(
+            is_linked=Exists(self.model_class.objects.filter(
+                owner=self.user, recipe=OuterRef('pk'),
+            )),
+        ).values_list('pk', 'is_linked').order_by())
+
+    def perform_create(self, ids: List[int]) -> List[int]:
+        created = bulk_insert_ignore_returning(
+            self.model_class, 'recipe_id', ids, owner_id=self.user.pk,
+        )
+        self.update_links(created, is_linked=True)
+        return created
+
+    def perform_delete(self, ids: List[int]) -> List[int]:
+        # These rows have no dependents to collect.
+        deleted = bulk_delete_returning(
+            self.model_class, 'recipe_id', ids, owner_id=self.user.pk,
+        )
+        self.update_links(deleted, is_linked=False)
+        return deleted
+
+    def update_links(self, ids: List[int], is_linked: bool) -> None:
+        """
+        Does what `recipes.signals` receivers do for every written row,
+        with one statement per counter.
+        """
+        if not ids:
+            return
+        recipes = Recipe.objects.filter(pk__in=ids)
+        if self.model_class is Favorite:
+            if is_linked:
+                increment_counter(recipes, 'favorites_count')
+            else:
+                decrement_counter(recipes, 'favorites_count')
+            RecipeCacheVersions.bump_favorites_counts(ids)
+        if is_linked:
+            UserMemberships.add(self.model_class, self.user.pk, ids)
+        else:
+            UserMemberships.remove(self.model_class, self.user.pk, ids)
+
+
+class CartItemBulkCreateDelete(FavoriteCartBulkCreateDelete):
+    """Keeps `ShoppingCartTotal` in the transaction of the cart change."""
+
+    def __init__(self, request: Request, already_exists_error_message: str,
+                 model_not_exists_error_message: str) -> None:
+        super().__init__(request, CartItem, already_exists_error_message,
+                         model_not_exists_error_message)
+
+    def perform_create(self, ids: List[int]) -> List[int]:
+        created = super().perform_create(ids)
+        if created:
+            ShoppingCartTotals.add_recipes(self.user, created)
+        return created
+
+    def perform_delete(self, ids: List[int]) -> List[int]:
+        deleted = super().perform_delete(ids)
+        if deleted:
+            ShoppingCartTotals.remove_recipes(self.user, deleted)
+        return deleted
+
+
+class ShoppingCartTotals:
+    """
+    Maintains `ShoppingCartTotal` incrementally.
+
+    Every change is expressed as per-ingredient amount deltas applied
+    to a set of owners: positive deltas are one upsert, negative deltas
+    are one update that stops at zero and one delete of rows at zero.
+    Callers must run inside the transaction that changes the cart or the
+    recipe. `rebuild` recomputes the totals from `CartItem` to repair drift
+    after changes made outside of these methods, e.g. in the admin.
+    """
+
+    @classmethod
+    def add_recipe(cls, owner: User, recipe: Recipe) -> None:
+        cls.apply_deltas(cls._owner_ids(owner), cls.get_amounts(recipe))
+
+    @classmethod
+    def remove_recipe(cls, owner: User, recipe: Recipe) -> None:
+        cls.apply_deltas(cls._owner_ids(owner), {
+            ingredient_id: -amount
+            for ingredient_id, amount in cls.get_amounts(recipe).items()
+        })
+
+    @classmethod
+    def add_recipes(cls, owner: User, recipe_ids: Iterable[int]) -> None:
+        cls.apply_deltas(cls._owner_ids(owner),
+                         cls.get_total_amounts(recipe_ids))
+
+    @classmethod
+    def remove_recipes(cls, owner: User, recipe_ids: Iterable[int]) -> None:
+        cls.apply_deltas(cls._owner_ids(owner), {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in cls.get_total_amounts(recipe_ids).items()
+        })
+
+    @classmethod
+    def remove_recipe_from_carts(cls, recipe: Recipe) -> None:
+        cls.change_recipe_amounts(recipe, cls.get_amounts(recipe), {})
+
+    @classmethod
+    def change_recipe_amounts(cls, recipe: Recipe,
+                              old_amounts: Dict[int, int],
+                              new_amounts: Dict[int, int]) -> None:
+        """Applies an ingredients change to every cart with `recipe`."""
+        deltas = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        owner_ids = CartItem.objects.filter(recipe=recipe).values('owner')
+        cls.apply_deltas(owner_ids, deltas)
+
+    @staticmethod
+    def get_amounts(recipe: Recipe) -> Dict[int, int]:
+        return dict(
+            recipe.recipe_ingredient.values_list('ingredient_id', 'amount')
+        )
+
+    @staticmethod
+    def get_total_amounts(recipe_ids: Iterable[int]) -> Dict[int, int]:
+        return dict(RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids,
+        ).values('ingredient_id').annotate(
+            total=Sum('amount'),
+        ).values_list('ingredient_id', 'total').order_by())
+
+    @classmethod
+    def apply_deltas(cls, owner_ids: QuerySet,
+                     deltas: Dict[int, int]) -> None:
+        """
+        Adds `deltas` ({ingredient_id: amount}) to the totals of every
+        owner in `owner_ids`, a queryset of a single owner id column.
+        """
+        increments = {i: d for i, d in deltas.items() if d > 0}
+        decrements = {i: -d for i, d in deltas.items() if d < 0}
+        if increments:
+            cls._increment(owner_ids, increments)
+        if decrements:
+            cls._decrement(owner_ids, decrements)
+
+    @classmethod
+    def rebuild(cls, owner_ids: Optional[Iterable[int]] = None,
+                batch_size: int = 1000) -> int:
+        """Recomputes totals of `owner_ids` or of everyone."""
+        totals = ShoppingCartTotal.objects.all()
+        cart_items = CartItem.objects.filter(
+            recipe__recipe_ingredient__isnull=False
+        )
+        if owner_ids is not None:
+            totals = totals.filter(owner__in=owner_ids)
+            cart_items = cart_items.filter(owner__in=owner_ids)
+        rows = cart_items.values(
+            'owner', 'recipe__recipe_ingredient__ingredient'
+        ).annotate(
+            total_amount=Sum('recipe__recipe_ingredient__amount')
+        ).order_by()
+        with transaction.atomic():
+            totals.delete()
+            created = ShoppingCartTotal.objects.bulk_create(
+                (
+                    ShoppingCartTotal(
+                        owner_id=row['owner'],
+                        ingredient_id=row[
+                            'recipe__recipe_ingredient__ingredient'
+                        ],
+                        amount=row['total_amount'],
+                    )
+                    for row in rows.iterator()
+                ),
+                batch_size=batch_size,
+            )
+        return len(created)
+
+    @staticmethod
+    def _owner_ids(owner: User) -> QuerySet:
+        return User.objects.filter(pk=owner.pk).values('pk').order_by()
+
+    @staticmethod
+    def _increment(owner_ids: QuerySet, increments: Dict[int, int]) -> None:
+        table = connection.ops.quote_name(ShoppingCartTotal._meta.db_table)
+        owners_sql, owners_params = owner_ids.query.sql_with_params()
+        amounts_sql = ' UNION ALL '.join(
+            ['SELECT %s AS ingredient_id, %s AS amount'] * len(increments)
+        )
+        amounts_params = [
+            value for item in increments.items() for value in item
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (owner_id, ingredient_id, amount) '
+                f'SELECT * FROM ({owners_sql}) AS owners '
+                f'CROSS JOIN ({amounts_sql}) AS amounts '
+                f'WHERE TRUE '
+                f'ON CONFLICT (owner_id, ingredient_id) DO UPDATE '
+                f'SET amount = {table}.amount + EXCLUDED.amount',
+                (*owners_params, *amounts_params),
+            )
+
+    @staticmethod
+    def _decrement(owner_ids: QuerySet, decrements: Dict[int, int]) -> None:
+        totals = ShoppingCartTotal.objects.filter(
+            owner__in=owner_ids,
+            ingredient__in=decrements.keys(),
+        )
+        # The update locks the rows, so a concurrent change of the same
+        # totals waits for the transaction and the delete sees the rows
+        # as updated here. Totals that drifted below the decrement stop
+        # at zero instead of failing the check of the column.
+        totals.update(amount=Greatest(
+            F('amount') - Case(
+                *(When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in decrements.items()),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+            output_field=IntegerField(),
+        ))
+        totals.filter(amount__lte=0).delete()
+
+
+class BulkLoadRefresh:
+    """
+    Bulk loads skip signals, so loaders pass the written rows to `add`
+    and `refresh` does what the receivers would do for them: counters,
+    shopping cart totals, documents and cached responses of the rows
+    the loaded tables can affect are recomputed or invalidated. New
+    users and tags are referenced by no recipe yet, so they only change
+    their own lists.
+    """
+    BATCH_SIZE: int = 1000
+
+    def __init__(self) -> None:
+        self.models: Set[Type[Model]] = set()
+        # Authors of new recipes.
+        self.author_ids: Set[int] = set()
+        # Recipes whose tags or ingredients are loaded.
+        self.recipe_ids: Set[int] = set()
+        self.favorite_recipe_ids: Set[int] = set()
+        self.following_ids: Set[int] = set()
+        self.cart_owner_ids: Set[int] = set()
+        # Users whose favorites, cart items or follows are loaded.
+        self.member_ids: Set[int] = set()
+
+    def add(self, model: Type[Model], instances: Iterable[Model]) -> None:
+        self.models.add(model)
+        for instance in instances:
+            if model is Recipe:
+                self.author_ids.add(instance.author_id)
+            elif model in (RecipeIngredient, Recipe.tags.through):
+                self.recipe_ids.add(instance.recipe_id)
+            elif model is Favorite:
+                self.favorite_recipe_ids.add(instance.recipe_id)
+                self.member_ids.add(instance.owner_id)
+            elif model is CartItem:
+                self.cart_owner_ids.add(instance.owner_id)
+                self.member_ids.add(instance.owner_id)
+            elif model is Follow:
+                self.following_ids.add(instance.following_id)
+                self.member_ids.add(instance.user_id)
+
+    def refresh(self) -> None:
+        with transaction.atomic():
+            self._reconcile(Recipe, 'favorites_count', Favorite, 'recipe',
+                            self.favorite_recipe_ids)
+            self._reconcile(User, 'recipes_count', Recipe, 'author',
+                            self.author_ids)
+            self._reconcile(User, 'followers_count', Follow, 'following',
+                            self.following_ids)
+            owner_ids = set(self.cart_owner_ids)
+            for ids in self._batches(self.recipe_ids):
+                owner_ids.update(CartItem.objects.filter(
+                    recipe__in=ids
+                ).values_list('owner', flat=True))
+                RecipeDocuments.invalidate(recipe_id__in=ids)
+            for ids in self._batches(owner_ids):
+                ShoppingCartTotals.rebuild(ids)
+            versions = [*map(RecipeCacheVersions.recipe, self.recipe_ids),
+                        *map(UserMemberships.version, self.member_ids)]
+            if self.recipe_ids or self.author_ids:
+                versions.append(RecipeCacheVersions.RECIPES)
+            if self.favorite_recipe_ids:
+                RecipeCacheVersions.bump_favorites_counts(
+                    self.favorite_recipe_ids
+                )
+            if Tag in self.models:
+                versions.append(RecipeCacheVersions.TAGS)
+            if Ingredient in self.models:
+                versions.append(RecipeCacheVersions.INGREDIENTS)
+            if versions:
+                bump_versions(*versions)
+
+    def _reconcile(self, model: Type[Model], field: str,
+                   related_model: Type[Model], related_field: str,
+                   ids: Set[int]) -> None:
+        for batch in self._batches(ids):
+            reconcile_counter(model.objects.filter(pk__in=batch), field,
+                              related_model.objects.all(), related_field)
+
+    def _batches(self, ids: Set[int]) -> Iterator[List[int]]:
+        ids = sorted(ids)
+        for start in range(0, len(ids), self.BATCH_SIZE):
+            yield ids[start:start + self.BATCH_SIZE]
+
+
 class ShoppingCartPdfGenerator:
+    """
+    Renders the shopping list of the user to PDF.
+
+    PDFs are cached under a digest of the aggregated ingredient rows,
+    which is also sent as `ETag`, so repeat downloads of an unchanged
+    list are answered from the cache or with 304 without starting
+    the renderer.
+    """
+    FILENAME: str = 'shopping_cart.pdf'
+    # Bump when the output of the renderers changes.
+    CACHE_VERSION: int = 2
 
-    def generate_pdf(self, request):
-        recipes_in_shopping_cart = request.user.shopping_cart.values('recipe')
-        unique_ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipes_in_shopping_cart
-        ).values(
+    def generate_pdf(self, request: Request) -> HttpResponse:
+        unique_ingredients = list(self.get_unique_ingredients(request.user))
+        digest = self.get_digest(unique_ingredients)
+        etag = quote_etag(digest)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = FileResponse(
+                BytesIO(self.get_pdf(digest, unique_ingredients)),
+                filename=self.FILENAME,
+                content_type='application/pdf',
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_unique_ingredients(self, user: User) -> QuerySet:
+        return user.shopping_cart_totals.values(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-        template = get_template('recipes/shopping_cart.html')
-        html = template.render({'unique_ingredients': unique_ingredients})
-        options = {
-            'page-size': 'Letter',
-            'encoding': "UTF-8",
-        }
-        pdf = pdfkit.from_string(html, False, options)
-        buffer = BytesIO(pdf)
-        return FileResponse(buffer, filename='shopping_cart.pdf',
-                            content_type='application/pdf')
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+    def get_digest(self, unique_ingredients: list) -> str:
+        payload = json.dumps(
+            [self.CACHE_VERSION, settings.SHOPPING_CART_PDF_RENDERER,
+             unique_ingredients],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_pdf(self, digest: str, unique_ingredients: list) -> bytes:
+        cache = caches[settings.SHOPPING_CART_PDF_CACHE]
+        pdf = cache.get(digest)
+        if pdf is None:
+            pdf = get_shopping_cart_renderer().render(unique_ingredients)
+            cache.set(digest, pdf)
+        return pdf
@@ -0,0 +1,158 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from core.counters import decrement_counter, increment_counter
+from recipes.documents import RecipeDocuments
+from recipes.memberships import UserMemberships
+from recipes.models import (CartItem, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.search import ingredient_search_index
+from recipes.services import RecipeCacheVersions, ShoppingCartTotals
+from users.models import User
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: ingredient_search_index.update(instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_from_ingredient_search_index(sender, instance, **kwargs):
+    ingredient_id = instance.pk
+    transaction.on_commit(
+        lambda: ingredient_search_index.remove(ingredient_id)
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_cart_totals(sender, instance, **kwargs):
+    """Runs in the deletion transaction, before the cart items cascade."""
+    ShoppingCartTotals.remove_recipe_from_carts(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(User.objects.filter(pk=instance.author_id),
+                          'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    decrement_counter(User.objects.filter(pk=instance.author_id),
+                      'recipes_count')
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(Recipe.objects.filter(pk=instance.recipe_id),
+                          'favorites_count')
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    decrement_counter(Recipe.objects.filter(pk=instance.recipe_id),
+                      'favorites_count')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_recipe_cache_version(sender, instance, **kwargs):
+    RecipeCacheVersions.bump_recipe(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def bump_related_recipe_cache_version(sender, instance, **kwargs):
+    RecipeCacheVersions.bump_recipe(instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def bump_favorites_count_cache_version(sender, instance, **kwargs):
+    RecipeCacheVersions.bump_favorites_counts((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_cache_version(sender, instance, action, reverse,
+                                   **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        RecipeCacheVersions.bump_catalog()
+    else:
+        RecipeCacheVersions.bump_recipe(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_catalog_cache_version(sender, **kwargs):
+    RecipeCacheVersions.bump_catalog(
+        RecipeCacheVersions.TAGS if sender is Tag
+        else RecipeCacheVersions.INGREDIENTS
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_authors_cache_version(sender, created, update_fields, **kwargs):
+    """
+    New users have no recipes yet and `last_login` is updated on every
+    login without being shown, so only other updates are relevant.
+    """
+    if not created and update_fields != frozenset(('last_login',)):
+        RecipeCacheVersions.bump_catalog()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=CartItem)
+def add_recipe_to_user_memberships(sender, instance, created, **kwargs):
+    if created:
+        UserMemberships.add(sender, instance.owner_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=CartItem)
+def remove_recipe_from_user_memberships(sender, instance, **kwargs):
+    UserMemberships.remove(sender, instance.owner_id,
+                           [instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_document(sender, instance, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    RecipeDocuments.invalidate_recipes([recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_documents(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            RecipeDocuments.invalidate_recipes([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        RecipeDocuments.invalidate_recipes(pk_set)
+    elif action == 'pre_clear':
+        RecipeDocuments.invalidate(recipe__tags=instance)
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def invalidate_tag_documents(sender, instance, **kwargs):
+    """Links of deleted tags are gone after the deletion."""
+    RecipeDocuments.invalidate(recipe__tags=instance)
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def invalidate_ingredient_documents(sender, instance, **kwargs):
+    """Signals of cascaded recipe ingredients make no more queries."""
+    RecipeDocuments.invalidate_recipes(
+        instance.recipe_ingredient.values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_documents(sender, created, instance, update_fields,
+                                **kwargs):
+    """See `bump_authors_cache_version`."""
+    if not created and update_fields != frozenset(('last_login',)):
+        RecipeDocuments.invalidate(recipe__author=instance)
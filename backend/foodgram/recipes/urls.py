@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.views import (CatalogSnapshotView, CatalogVersionView,
+                           IngredientViewSet, RecipeViewSet, TagViewSet)
 
 app_name = 'recipes'
 
@@ -12,4 +13,8 @@ router_v1.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('', include(router_v1.urls)),
+    path('catalog/version/', CatalogVersionView.as_view(),
+         name='catalog-version'),
+    path('catalog/<slug:name>.<slug:digest>.json',
+         CatalogSnapshotView.as_view(), name='catalog-snapshot'),
 ]
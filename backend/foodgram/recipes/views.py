@@ -1,87 +1,141 @@
-from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Prefetch, Subquery
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
 from django_filters import rest_framework as filters
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from core.cache import AnonymousResponseCacheMixin, ConditionalGetMixin
 from core.pagination import LimitPagionation
+from recipes.catalog import CatalogSnapshots
+from recipes.documents import RecipeDocuments
 from recipes.filters import IngredientFilter, RecipeFilter
-from recipes.models import CartItem, Favorite, Ingredient, Recipe, Tag
+from recipes.memberships import UserMemberships
+from recipes.models import Favorite, Ingredient, Recipe, Tag
+from recipes.search import ingredient_search_index
 from recipes.serializers.common import (IngredientSerializer,
                                         RecipeCreateSerializer,
-                                        RecipeSerializer, TagSerializer)
-from recipes.services import FavoriteCartCreateDelete, ShoppingCartPdfGenerator
-from users.models import Follow
+                                        RecipeDocumentSerializer,
+                                        ShoppingCartTotalSerializer,
+                                        TagSerializer)
+from recipes.services import (CartItemBulkCreateDelete, CartItemCreateDelete,
+                              FavoriteCartBulkCreateDelete,
+                              FavoriteCartCreateDelete, RecipeCacheVersions,
+                              ShoppingCartPdfGenerator)
 
-User = get_user_model()
 
-
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
 
+    def get_conditional_versions(self):
+        return (RecipeCacheVersions.TAGS,)
+
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def get_conditional_versions(self):
+        return (RecipeCacheVersions.INGREDIENTS,)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_SEARCH_INDEX_ENABLED:
+            return self.get_conditional_response(self.search, request, name)
+        return super().list(request, *args, **kwargs)
+
+    def search(self, request, name):
+        return Response(ingredient_search_index.search(name))
 
-class RecipeViewSet(ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousResponseCacheMixin,
+                    ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = LimitPagionation
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
     lookup_url_kwarg = 'recipe_id'
+    cursor_ordering = ('-created_at', '-id')
+    FAVORITE_ALREADY_EXISTS = 'Нельзя дважды добавить рецепт в избранное!'
+    FAVORITE_NOT_EXISTS = 'Рецепт не в избранном!'
+    CART_ITEM_ALREADY_EXISTS = (
+        'Нельзя дважды добавить рецепт в корзине товаров!'
+    )
+    CART_ITEM_NOT_EXISTS = 'Рецепт не в корзине товаров!'
 
     def get_queryset(self):
-        user = self.request.user
         queryset = super().get_queryset()
-        user_queryset = User.objects.all()
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_favorited=Exists(Subquery(
-                    Favorite.objects.filter(owner=user, recipe=OuterRef('pk'))
-                ))
-            ).annotate(
-                is_in_shopping_cart=Exists(Subquery(
-                    CartItem.objects.filter(owner=user, recipe=OuterRef('pk'))
-                ))
-            )
-            user_queryset = user_queryset.annotate(
-                is_subscribed=Exists(Subquery(
-                    Follow.objects.filter(user=user, following=OuterRef('pk'))
-                ))
-            )
-        if self.action == 'list':
-            return queryset.prefetch_related(
-                Prefetch('author', user_queryset)
-            ).prefetch_related(
-                'tags'
-            ).prefetch_related(
-                'recipe_ingredient'
-            ).prefetch_related(
-                'recipe_ingredient__ingredient'
+        if self.action in ('list', 'retrieve'):
+            # Everything else is in the document.
+            return queryset.select_related('document').only(
+                'id', 'author_id', 'favorites_count', 'created_at',
+                'document__version', 'document__built_version',
+                'document__body',
             )
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['memberships'] = UserMemberships.get(self.request.user)
+        if self.request.user.is_anonymous:
+            # Cached by `AnonymousResponseCacheMixin` without the counts.
+            context['favorites_count'] = False
+        return context
+
+    def render_cached_data(self, data):
+        if isinstance(data, dict):
+            return {**data, 'results': RecipeDocuments.render_favorites_counts(
+                data['results']
+            )}
+        return RecipeDocuments.render_favorites_counts([data])[0]
+
+    def get_response_cache_versions(self):
+        if self.action == 'retrieve':
+            return (RecipeCacheVersions.CATALOG, RecipeCacheVersions.recipe(
+                self.kwargs.get(self.lookup_url_kwarg)
+            ))
+        return (RecipeCacheVersions.CATALOG, RecipeCacheVersions.RECIPES)
+
+    def get_conditional_versions(self):
+        versions = self.get_response_cache_versions()
+        if self.action == 'list':
+            versions += (RecipeCacheVersions.FAVORITES_COUNTS,)
+        if self.request.user.is_authenticated:
+            versions += (UserMemberships.version(self.request.user.pk),)
+        return versions
+
     def get_permissions(self):
         if self.action in ('favorite', 'shopping_cart',
-                           'download_shopping_cart',):
+                           'bulk_favorite', 'bulk_shopping_cart',
+                           'download_shopping_cart',
+                           'shopping_cart_summary',):
             return (IsAuthenticated(),)
         return (IsAuthenticatedOrReadOnly(),)
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateSerializer
-        return RecipeSerializer
+        return RecipeDocumentSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        with RecipeDocuments.batch_invalidation():
+            instance.delete()
+
     @action(methods=('post', 'delete',), detail=True)
     def favorite(self, request, *args, **kwargs):
         favorite = FavoriteCartCreateDelete(
@@ -89,28 +143,109 @@ class RecipeViewSet(ModelViewSet):
             self.get_queryset(),
             self.kwargs.get('recipe_id'),
             Favorite,
-            'Нельзя дважды добавить рецепт в избранное!',
-            'Рецепт не в избранном!',
+            self.FAVORITE_ALREADY_EXISTS,
+            self.FAVORITE_NOT_EXISTS,
         )
         if request.method == 'POST':
             return favorite.create()
         return favorite.delete()
 
+    @action(methods=('post', 'delete',), detail=False, url_path='favorite')
+    def bulk_favorite(self, request, *args, **kwargs):
+        favorites = FavoriteCartBulkCreateDelete(
+            request,
+            Favorite,
+            self.FAVORITE_ALREADY_EXISTS,
+            self.FAVORITE_NOT_EXISTS,
+        )
+        if request.method == 'POST':
+            return favorites.create()
+        return favorites.delete()
+
     @action(methods=('post', 'delete',), detail=True)
     def shopping_cart(self, request, *args, **kwargs):
-        cart_item = FavoriteCartCreateDelete(
+        cart_item = CartItemCreateDelete(
             request,
             self.get_queryset(),
             self.kwargs.get('recipe_id'),
-            CartItem,
-            'Нельзя дважды добавить рецепт в корзине товаров!',
-            'Рецепт не в корзине товаров!',
+            self.CART_ITEM_ALREADY_EXISTS,
+            self.CART_ITEM_NOT_EXISTS,
         )
         if request.method == 'POST':
             return cart_item.create()
         return cart_item.delete()
 
+    @action(methods=('post', 'delete',), detail=False,
+            url_path='shopping_cart')
+    def bulk_shopping_cart(self, request, *args, **kwargs):
+        cart_items = CartItemBulkCreateDelete(
+            request,
+            self.CART_ITEM_ALREADY_EXISTS,
+            self.CART_ITEM_NOT_EXISTS,
+        )
+        if request.method == 'POST':
+            return cart_items.create()
+        return cart_items.delete()
+
     @action(methods=('get',), detail=False)
     def download_shopping_cart(self, request, *args, **kwargs):
         pdf_generator = ShoppingCartPdfGenerator()
         return pdf_generator.generate_pdf(request)
+
+    @action(methods=('get',), detail=False)
+    def shopping_cart_summary(self, request, *args, **kwargs):
+        queryset = request.user.shopping_cart_totals.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
+        serializer = ShoppingCartTotalSerializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class CatalogVersionView(APIView):
+    """Digests and URLs of current snapshots of tags and ingredients."""
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        response = Response({
+            name: {
+                'version': digest,
+                'url': request.build_absolute_uri(reverse(
+                    'recipes:catalog-snapshot',
+                    kwargs={'name': name, 'digest': digest},
+                )),
+            }
+            for name, digest in CatalogSnapshots.get_digests().items()
+        })
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class CatalogSnapshotView(APIView):
+    """
+    Snapshot of tags or ingredients in the encoding accepted by the client.
+    The URL changes with the content, so it is cached for as long as
+    possible.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request, name, digest):
+        encoded_body = CatalogSnapshots.get_encoded_body(
+            name, digest, request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoded_body is None:
+            raise Http404
+        body, encoding = encoded_body
+        # Strong tags must differ between representations.
+        etag = quote_etag(digest if encoding is None
+                          else f'{digest}-{encoding}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+            if encoding is not None:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=settings.CATALOG_SNAPSHOT_MAX_AGE)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
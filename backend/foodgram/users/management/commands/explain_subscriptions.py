@@ -0,0 +1,90 @@
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.db.models import BooleanField, Exists, F, OuterRef, Subquery, Value
+
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = '''
+    Prints query plans of the subscriptions listing before and after
+    it was driven from the Follow table, on a synthetic user table.
+    Synthetic rows are created in a transaction that is rolled back.
+    '''
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=100_000,
+                            help='Number of synthetic users')
+        parser.add_argument('--follows', type=int, default=3,
+                            help='Number of authors followed by each user')
+        parser.add_argument('--limit', type=int, default=6,
+                            help='Page size')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run EXPLAIN ANALYZE on PostgreSQL')
+
+    def handle(self, *args: Any, **options: Any) -> str:
+        with transaction.atomic():
+            follower = self.create_synthetic_data(options['users'],
+                                                  options['follows'])
+            for title, queryset in (
+                ('Before: annotated users table', self.get_old_queryset),
+                ('After: Follow table', self.get_new_queryset),
+            ):
+                page = queryset(follower)[:options['limit']]
+                self.stdout.write(f'{title}\n{page.query}\n')
+                self.stdout.write(self.explain(page, options['analyze']))
+                self.stdout.write('')
+            transaction.set_rollback(True)
+        return 'Synthetic data is rolled back.'
+
+    def create_synthetic_data(self, users: int, follows: int) -> User:
+        User.objects.bulk_create(
+            (
+                User(username=f'explain_{i}', email=f'explain_{i}@example.org',
+                     password='!')
+                for i in range(users)
+            ),
+            batch_size=5000,
+        )
+        synthetic = list(User.objects.filter(
+            username__startswith='explain_'
+        ).order_by('id').values_list('id', flat=True))
+        # Every synthetic user follows the next `follows` users, so the
+        # Follow table grows together with the users table.
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id,
+                       following_id=synthetic[(i + shift) % len(synthetic)])
+                for i, user_id in enumerate(synthetic)
+                for shift in range(1, follows + 1)
+            ),
+            batch_size=5000,
+        )
+        follower = User.objects.get(pk=synthetic[0])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return follower
+
+    def get_old_queryset(self, follower: User):
+        return User.objects.annotate(
+            is_subscribed=Exists(Subquery(
+                Follow.objects.filter(user=follower, following=OuterRef('pk'))
+            ))
+        ).filter(is_subscribed=True)
+
+    def get_new_queryset(self, follower: User):
+        # Mirrors `UserViewSet.get_queryset` for the subscriptions action.
+        return User.objects.filter(following__user=follower).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+            followed_at=F('following__id'),
+        ).order_by('-followed_at')
+
+    def explain(self, queryset, analyze: bool) -> str:
+        if analyze and connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    User.objects.update(followers_count=Coalesce(Subquery(
+        Follow.objects.filter(following=OuterRef('pk')).order_by().values(
+            'following'
+        ).annotate(count=Count('pk')).values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'ordering': ('-id',), 'verbose_name': 'user', 'verbose_name_plural': 'users'},
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число рецептов'),
+        ),
+        migrations.RunPython(
+            fill_followers_count,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-id', 'following'], name='follow_user_recent_idx'),
+        ),
+    ]
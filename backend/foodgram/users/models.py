@@ -1,14 +1,27 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from core.counters import CounterFieldsMixin
 
-class User(AbstractUser):
+
+class User(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(
         'Email адрес',
         help_text='Введите email адрес',
         unique=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        editable=False,
+    )
 
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
@@ -45,6 +58,14 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'follow'
         verbose_name_plural = 'follows'
+        indexes = (
+            # Covers subscriptions listing: rows of a follower in follow
+            # order together with the followed user ids.
+            models.Index(
+                fields=('user', '-id', 'following'),
+                name='follow_user_recent_idx',
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'following'),
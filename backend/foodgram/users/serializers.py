@@ -1,19 +1,69 @@
+from typing import Callable, Dict, List
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
 from django.db import IntegrityError
+from django.db.models import Manager
 from rest_framework import serializers
 
+from core.prefetch import get_limited_values, prefetch_limited
+from core.renderers import RawJSON
+from core.serialization import get_field_plan, get_file_url, render_json_list
+from recipes.memberships import UserMemberships
+from recipes.models import Recipe
 from recipes.serializers.nested import RecipeShorthandSerializer
 
 User = get_user_model()
 
+EMPTY_JSON_LIST = render_json_list(())
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """
+    `UserSerializer` of many users, which renders rows of
+    `values(*VALUES)` with a `FieldPlan` instead of running serializer
+    fields for every user. Model instances are serialized as usual.
+    The output is compared with `UserSerializer` by the
+    `check_fast_serializers` command.
+    """
+    VALUES = ('email', 'id', 'username', 'first_name', 'last_name')
+
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, Manager) else data)
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+        plan = get_field_plan(self.child.Meta.fields)
+        is_subscribed = self.get_is_subscribed()
+        return [
+            plan.render(self.get_values(row, is_subscribed)) for row in rows
+        ]
+
+    def get_is_subscribed(self) -> Callable[[dict], bool]:
+        """Does what `UserSerializer.get_is_subscribed` does for rows."""
+        memberships = self.context.get('memberships')
+        if memberships is None:
+            memberships = UserMemberships.get(self.context['request'].user)
+
+        def is_subscribed(row: dict) -> bool:
+            if 'is_subscribed' in row:
+                return row['is_subscribed']
+            return (memberships is not None
+                    and memberships.is_subscribed(row['id']))
+
+        return is_subscribed
+
+    def get_values(self, row: dict,
+                   is_subscribed: Callable[[dict], bool]) -> dict:
+        return dict(row, is_subscribed=is_subscribed(row))
+
 
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for User model.
-    Be sure to annotate `is_subscribed`
+    Be sure to annotate `is_subscribed` or pass `UserMemberships`
+    of the user as `memberships` in the context
     when many=True for optimized queries.
     """
     is_subscribed = serializers.SerializerMethodField()
@@ -22,10 +72,14 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed')
         model = User
+        list_serializer_class = UserListSerializer
 
     def get_is_subscribed(self, obj):
         if hasattr(obj, 'is_subscribed'):
             return obj.is_subscribed
+        memberships = self.context.get('memberships')
+        if memberships is not None:
+            return memberships.is_subscribed(obj.pk)
         user = self.context['request'].user
         return (user.is_authenticated
                 and obj.following.filter(user=user).exists())
@@ -90,24 +144,98 @@ class PasswordSerializer(serializers.Serializer):
         return value
 
 
+class SubscriptionsListSerializer(UserListSerializer):
+    """
+    `SubscriptionsSerializer` of many users. Recipes of rows of
+    `values(*VALUES)` are loaded as `values()` too and recipes of model
+    instances are prefetched.
+    """
+    VALUES = UserListSerializer.VALUES + ('recipes_count', 'followers_count')
+
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, Manager) else data)
+        recipes_limit = self.child.get_recipes_limit(
+            self.context.get('recipes_limit')
+        )
+        if rows and not isinstance(rows[0], dict):
+            if not hasattr(rows[0], 'limited_recipes'):
+                self.child.prefetch_recipes(rows, recipes_limit)
+            return super().to_representation(rows)
+        self.recipes = self.render_recipes(rows, recipes_limit)
+        return super().to_representation(rows)
+
+    @staticmethod
+    def render_recipes(rows: List[dict],
+                       recipes_limit: int) -> Dict[int, RawJSON]:
+        """Returns `RecipeShorthandSerializer` lists by author ids."""
+        fields = RecipeShorthandSerializer.Meta.fields
+        plan = get_field_plan(fields)
+        storage = Recipe._meta.get_field('image').storage
+        recipes = get_limited_values(
+            Recipe.objects.all(), 'author', [row['id'] for row in rows],
+            recipes_limit, fields,
+        )
+        return {
+            author_id: render_json_list(
+                plan.render(dict(recipe, image=get_file_url(
+                    storage, recipe['image']
+                )))
+                for recipe in author_recipes
+            )
+            for author_id, author_recipes in recipes.items()
+        }
+
+    def get_values(self, row: dict,
+                   is_subscribed: Callable[[dict], bool]) -> dict:
+        return dict(row, is_subscribed=is_subscribed(row),
+                    recipes=self.recipes.get(row['id'], EMPTY_JSON_LIST))
+
+
 class SubscriptionsSerializer(UserSerializer):
+    """
+    Serializer for subscriptions.
+    Be sure to call `prefetch_recipes` on a single user
+    for optimized queries, lists prefetch recipes themselves.
+    """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + (
             'recipes',
             'recipes_count',
+            'followers_count',
+        )
+        list_serializer_class = SubscriptionsListSerializer
+
+    @staticmethod
+    def get_recipes_limit(value) -> int:
+        """
+        Returns `recipes_limit` query param capped by
+        `RECIPES_MAX_LIMIT_IN_SUBSCRIPTIONS`, which is also the default.
+        """
+        limit = settings.RECIPES_MAX_LIMIT_IN_SUBSCRIPTIONS
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, int) and value > 0:
+            return min(value, limit)
+        return limit
+
+    @classmethod
+    def prefetch_recipes(cls, users, recipes_limit: int) -> None:
+        """Prefetches at most `recipes_limit` latest recipes per user."""
+        prefetch_limited(
+            users, 'recipes', recipes_limit,
+            queryset=Recipe.objects.only(
+                *RecipeShorthandSerializer.Meta.fields, 'author',
+            ),
+            to_attr='limited_recipes',
         )
 
     def get_recipes(self, obj):
-        queryset = obj.recipes.all()
-        recipes_limit = self.context.get('recipes_limit')
-        if isinstance(recipes_limit, int) and recipes_limit > 0:
-            recipes_limit = min(recipes_limit,
-                                settings.RECIPES_MAX_LIMIT_IN_SUBSCRIPTIONS)
-            queryset = queryset[:recipes_limit]
-        return RecipeShorthandSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()[:self.get_recipes_limit(
+                self.context.get('recipes_limit')
+            )]
+        return RecipeShorthandSerializer(recipes, many=True).data
@@ -1,12 +1,19 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.db.models.query import QuerySet
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from core.bulk import BulkCreateDelete
+from core.counters import decrement_counter, increment_counter
+from core.toggles import (bulk_delete_returning, bulk_insert_ignore_returning,
+                          delete_returning, insert_ignore_returning)
+from recipes.memberships import UserMemberships
 from users.models import Follow
 from users.serializers import SubscriptionsSerializer
 
@@ -28,47 +35,94 @@ class SubsriptionCreateDelete:
         self.user_queryset: QuerySet = user_queryset
         self.following_user_id: Optional[int] = following_user_id
 
-    def get_subscription_serializer(self) -> SubscriptionsSerializer:
-        queryset = self.user_queryset.prefetch_related('recipes')
-        following = self._get_following_or_404(queryset)
+    def get_subscription_serializer(
+        self, following: User
+    ) -> SubscriptionsSerializer:
+        following.is_subscribed = True
+        recipes_limit = SubscriptionsSerializer.get_recipes_limit(
+            self.request.query_params.get('recipes_limit')
+        )
+        SubscriptionsSerializer.prefetch_recipes([following], recipes_limit)
         return SubscriptionsSerializer(instance=following)
 
     def create_subscribe(self) -> Response:
-        following = self._get_following_or_404()
+        following = self._get_following_or_404(self.user_queryset)
         if self.user == following:
             return Response(
                 {self.ERRORS_KEY: self.CANNOT_SUBSCRIBE_TO_YOURSELF},
                 status.HTTP_400_BAD_REQUEST,
             )
-        if self._is_follow_exists(following):
+        with transaction.atomic():
+            follow = insert_ignore_returning(Follow, user_id=self.user.pk,
+                                             following_id=following.pk)
+        if follow is None:
             return Response(
                 {self.ERRORS_KEY: self.CANNOT_SUBSCRIBE_TWICE},
                 status.HTTP_400_BAD_REQUEST,
             )
-
-        Follow.objects.create(user=self.user, following=following)
-        serializer = self.get_subscription_serializer()
+        serializer = self.get_subscription_serializer(following)
         return Response(serializer.data, status.HTTP_201_CREATED)
 
     def delete_subscribe(self) -> Response:
-        following = self._get_following_or_404()
-        if not self._is_follow_exists(following):
+        with transaction.atomic():
+            follow = delete_returning(Follow, user_id=self.user.pk,
+                                      following_id=self.following_user_id)
+        if follow is None:
+            self._get_following_or_404()
             return Response(
                 {self.ERRORS_KEY: self.CANNOT_UNSUBSCRIBED_IF_NOT_SUBSCRIBED},
                 status.HTTP_400_BAD_REQUEST,
             )
-        Follow.objects.get(user=self.user, following=following).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def _is_follow_exists(self, following: User) -> bool:
-        return Follow.objects.filter(
-            user=self.user,
-            following=following
-        ).exists()
-
     def _get_following_or_404(self,
                               queryset: QuerySet = User.objects.all()) -> User:
         return get_object_or_404(
             queryset,
             id=self.following_user_id,
         )
+
+
+class SubscriptionBulkCreateDelete(BulkCreateDelete):
+    NOT_FOUND_ERROR_MESSAGE: str = 'Пользователь не найден!'
+
+    def __init__(self, request: Request) -> None:
+        super().__init__(
+            request,
+            SubsriptionCreateDelete.CANNOT_SUBSCRIBE_TWICE,
+            SubsriptionCreateDelete.CANNOT_UNSUBSCRIBED_IF_NOT_SUBSCRIBED,
+        )
+
+    def get_links(self, ids: List[int]) -> Dict[int, bool]:
+        return dict(User.objects.filter(pk__in=ids).annotate(
+            is_linked=Exists(Follow.objects.filter(
+                user=self.user, following=OuterRef('pk'),
+            )),
+        ).values_list('pk', 'is_linked').order_by())
+
+    def validate_create(self, pk: int) -> Optional[str]:
+        if pk == self.user.pk:
+            return SubsriptionCreateDelete.CANNOT_SUBSCRIBE_TO_YOURSELF
+        return None
+
+    def perform_create(self, ids: List[int]) -> List[int]:
+        created = bulk_insert_ignore_returning(
+            Follow, 'following_id', ids, user_id=self.user.pk,
+        )
+        # Does what `users.signals` receivers do for every written row.
+        if created:
+            increment_counter(User.objects.filter(pk__in=created),
+                              'followers_count')
+        UserMemberships.add(Follow, self.user.pk, created)
+        return created
+
+    def perform_delete(self, ids: List[int]) -> List[int]:
+        # Follows have no dependents to collect.
+        deleted = bulk_delete_returning(
+            Follow, 'following_id', ids, user_id=self.user.pk,
+        )
+        if deleted:
+            decrement_counter(User.objects.filter(pk__in=deleted),
+                              'followers_count')
+        UserMemberships.remove(Follow, self.user.pk, deleted)
+        return deleted
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.counters import decrement_counter, increment_counter
+from recipes.memberships import UserMemberships
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(User.objects.filter(pk=instance.following_id),
+                          'followers_count')
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    decrement_counter(User.objects.filter(pk=instance.following_id),
+                      'followers_count')
+
+
+@receiver(post_save, sender=Follow)
+def add_following_to_user_memberships(sender, instance, created, **kwargs):
+    if created:
+        UserMemberships.add(Follow, instance.user_id,
+                            [instance.following_id])
+
+
+@receiver(post_delete, sender=Follow)
+def remove_following_from_user_memberships(sender, instance, **kwargs):
+    UserMemberships.remove(Follow, instance.user_id,
+                           [instance.following_id])
@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Subquery
+from django.db.models import BooleanField, F, Value
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -7,10 +7,12 @@ from rest_framework.response import Response
 
 from core.pagination import LimitPagionation
 from core.viewsets import CreateListRetrieveModelViewSet
-from users.models import Follow
-from users.serializers import (PasswordSerializer, SubscriptionsSerializer,
-                               UserCreateSerializer, UserSerializer)
-from users.services import SubsriptionCreateDelete
+from recipes.memberships import UserMemberships
+from users.serializers import (PasswordSerializer, SubscriptionsListSerializer,
+                               SubscriptionsSerializer, UserCreateSerializer,
+                               UserListSerializer, UserSerializer)
+from users.services import (SubscriptionBulkCreateDelete,
+                            SubsriptionCreateDelete)
 
 User = get_user_model()
 
@@ -21,23 +23,38 @@ class UserViewSet(CreateListRetrieveModelViewSet):
     pagination_class = LimitPagionation
     lookup_url_kwarg = 'user_id'
 
+    @property
+    def cursor_ordering(self):
+        if self.action == 'subscriptions':
+            return ('-followed_at',)
+        return ('-id',)
+
     def get_queryset(self):
         user = self.request.user
         queryset = super().get_queryset()
+        if self.action == 'list':
+            # Rendered by `UserListSerializer` without model instances.
+            return queryset.values(*UserListSerializer.VALUES)
         if user.is_anonymous:
             return queryset
-        if self.action in ('retrieve', 'list', 'subscribe',
-                           'subscriptions',):
-            return queryset.annotate(
-                is_subscribed=Exists(Subquery(
-                    Follow.objects.filter(user=user, following=OuterRef('pk'))
-                ))
+        if self.action == 'subscriptions':
+            return queryset.filter(following__user=user).annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+                followed_at=F('following__id'),
+            ).order_by('-followed_at').values(
+                *SubscriptionsListSerializer.VALUES, 'is_subscribed',
+                'followed_at',
             )
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['memberships'] = UserMemberships.get(self.request.user)
+        return context
+
     def get_permissions(self):
         if self.action in ('retrieve', 'me', 'set_password',
-                           'subscriptions', 'subscribe',):
+                           'subscriptions', 'subscribe', 'bulk_subscribe',):
             return (IsAuthenticated(),)
         return (AllowAny(),)
 
@@ -66,15 +83,11 @@ class UserViewSet(CreateListRetrieveModelViewSet):
 
     @action(methods=('get',), detail=False)
     def subscriptions(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(
-            self.get_queryset().filter(
-                is_subscribed=True
-            ).prefetch_related('recipes')
-        )
+        queryset = self.filter_queryset(self.get_queryset())
 
-        recipes_limit = request.query_params.get('recipes_limit', '')
-        if recipes_limit.isdigit():
-            recipes_limit = int(recipes_limit)
+        recipes_limit = SubscriptionsSerializer.get_recipes_limit(
+            request.query_params.get('recipes_limit')
+        )
         context = self.get_serializer_context()
         context.update({'recipes_limit': recipes_limit})
 
@@ -93,3 +106,10 @@ class UserViewSet(CreateListRetrieveModelViewSet):
         if request.method == 'POST':
             return subscription.create_subscribe()
         return subscription.delete_subscribe()
+
+    @action(methods=('post', 'delete'), detail=False, url_path='subscribe')
+    def bulk_subscribe(self, request, *args, **kwargs):
+        subscriptions = SubscriptionBulkCreateDelete(request)
+        if request.method == 'POST':
+            return subscriptions.create()
+        return subscriptions.delete()